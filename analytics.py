@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+PERIODS_PER_YEAR = 252  # Trading days
+
+
+def performance_metrics(values, turnover=None, initial_values=None, periods_per_year=PERIODS_PER_YEAR, risk_free_rate=0.0):
+    """
+    Performance & risk metrics of many runs at once. `values` is a dates x runs DataFrame of portfolio values
+    (NaN outside a run's dates), `turnover` an optional DataFrame of the same shape. `initial_values` (a scalar,
+    or one value per run as a dict / Series keyed like the columns or an array) is the capital each run started
+    with: returns, drawdowns & the first day's return are then measured from it, as the backtests' cum_return is,
+    instead of from the first recorded value (already net of the first day's costs & of tickers not yet listed).
+    Every metric is a column operation over the whole matrix, so hundreds of runs cost one pass. Returns one row per run:
+    start/end date, periods, final value, total & annualized return, annualized volatility, Sharpe & Sortino
+    (annualized, against `risk_free_rate` per year), max drawdown, max drawdown duration (periods under water)
+    & mean/annualized turnover.
+    """
+    matrix = values.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(matrix)
+    periods = valid.sum(axis=0)
+    rows = np.arange(len(matrix))[:, None]
+    first_row = np.argmax(valid, axis=0)
+    last_row = len(matrix) - 1 - np.argmax(valid[::-1], axis=0)
+    columns = np.arange(matrix.shape[1])
+    first, last = matrix[first_row, columns], matrix[last_row, columns]
+    if initial_values is None:
+        base, n_returns, peak_start, under_water_from = first, periods - 1, np.full(len(columns), -np.inf), first_row
+    else:
+        base = pd.Series(initial_values, index=values.columns).to_numpy(dtype=np.float64)
+        n_returns, peak_start, under_water_from = periods, base, first_row - 1  # The initial capital is the day before the first date
+
+    returns = np.full_like(matrix, np.nan)
+    np.divide(matrix[1:], matrix[:-1], out=returns[1:], where=matrix[:-1] != 0)
+    returns[1:] -= 1
+    if initial_values is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns[first_row, columns] = np.where(periods > 0, first / base - 1, np.nan)
+    excess = returns - risk_free_rate / periods_per_year
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total_return = last / base - 1
+        annualized_return = np.power(last / base, periods_per_year / np.maximum(n_returns, 1)) - 1
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(periods_per_year)
+        mean_excess = np.nanmean(excess, axis=0)
+        sharpe = mean_excess / np.nanstd(excess, axis=0, ddof=1) * np.sqrt(periods_per_year)
+        downside = np.sqrt(np.nanmean(np.minimum(excess, 0) ** 2, axis=0))
+        sortino = mean_excess / downside * np.sqrt(periods_per_year)
+
+        # Drawdowns against the running peak (fmax skips the NaNs before a run starts)
+        peak = np.fmax(np.fmax.accumulate(matrix, axis=0), peak_start)
+        drawdown = matrix / peak - 1
+        last_peak = np.maximum.accumulate(np.where(matrix >= peak, rows, under_water_from), axis=0)
+        under_water = np.where(valid, rows - last_peak, 0)
+
+    metrics = pd.DataFrame({
+        "start_date": values.index[first_row],
+        "end_date": values.index[last_row],
+        "periods": periods,
+        "final_value": last,
+        "total_return": total_return,
+        "annualized_return": annualized_return,
+        "annualized_volatility": volatility,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "max_drawdown": np.nanmin(drawdown, axis=0, initial=0.0, where=valid),
+        "max_drawdown_duration": under_water.max(axis=0, initial=0),
+    }, index=values.columns)
+
+    if turnover is not None:
+        turnover = turnover.reindex(index=values.index, columns=values.columns).to_numpy(dtype=np.float64)
+        turnover = np.where(valid, turnover, np.nan)
+        metrics["mean_turnover"] = np.nanmean(turnover, axis=0)
+        metrics["annualized_turnover"] = metrics["mean_turnover"] * periods_per_year
+    return metrics
+
+
+def rolling_metrics(values, window=63, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Rolling-window versions of the main metrics for every run at once. Returns a long DataFrame
+    (date, run, rolling_return, rolling_volatility, rolling_sharpe, rolling_drawdown) over `window` periods.
+    """
+    returns = values / values.shift(1) - 1
+    mean = returns.rolling(window, min_periods=window).mean()
+    std = returns.rolling(window, min_periods=window).std()
+    rolling = {
+        "rolling_return": values / values.shift(window) - 1,
+        "rolling_volatility": std * np.sqrt(periods_per_year),
+        "rolling_sharpe": mean / std * np.sqrt(periods_per_year),
+        "rolling_drawdown": values / values.rolling(window, min_periods=1).max() - 1,
+    }
+    frame = pd.DataFrame({
+        "date": np.repeat(values.index.to_numpy(), values.shape[1]),
+        "run": np.tile(values.columns.to_numpy(), len(values)),
+        **{name: matrix.to_numpy().ravel() for name, matrix in rolling.items()},
+    })
+    return frame.dropna(subset=list(rolling), how="all").reset_index(drop=True)
+
+
+def ticker_statistics(df, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Per-ticker descriptive statistics of a long-format (date, ticker, close, ...) table in one groupby pass:
+    row count, first/last date, close mean/std/min/max, mean & annualized volatility of daily returns,
+    & mean volume / last market cap where those columns exist.
+    """
+    df = df.sort_values(['ticker', 'date'], kind="stable")
+    ticker = df['ticker'].to_numpy()
+    close = df['close'].to_numpy(dtype=np.float64)
+    returns = np.full(len(close), np.nan)
+    same_ticker = ticker[1:] == ticker[:-1]
+    np.divide(close[1:], close[:-1], out=returns[1:], where=same_ticker & (close[:-1] != 0))
+    returns[1:] -= 1
+    returns[1:][~same_ticker] = np.nan
+
+    aggregations = {
+        "rows": ("close", "size"),
+        "first_date": ("date", "min"),
+        "last_date": ("date", "max"),
+        "close_mean": ("close", "mean"),
+        "close_std": ("close", "std"),
+        "close_min": ("close", "min"),
+        "close_max": ("close", "max"),
+        "return_mean": ("return", "mean"),
+        "return_volatility": ("return", "std"),
+    }
+    if 'volume' in df.columns:
+        aggregations["volume_mean"] = ("volume", "mean")
+    if 'market_cap' in df.columns:
+        aggregations["market_cap_last"] = ("market_cap", "last")
+
+    stats = df.assign(**{"return": returns}).groupby('ticker', observed=True, sort=True).agg(**aggregations)
+    stats["return_volatility"] *= np.sqrt(periods_per_year)
+    return stats
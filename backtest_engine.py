@@ -0,0 +1,324 @@
+import numpy as np
+import pandas as pd
+
+
+class Panel:
+    """
+    Long-format data pivoted once into aligned dates x tickers float64 matrices (NaN where no row exists).
+    """
+    def __init__(self, dates, tickers, fields):
+        self.dates = dates
+        self.tickers = tickers
+        self.fields = fields
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.tickers)
+
+
+def pivot_panel(df, fields=("close", "market_cap", "volume"), tickers=None):
+    """
+    Pivots a long (date, ticker, ...) DataFrame into a Panel. Where a (date, ticker) appears more than once
+    the last row wins. Fields missing from the DataFrame are skipped.
+    With `tickers` (sorted) the columns are that fixed universe, so chunks of one table line up.
+    """
+    date_index, dates = pd.factorize(df['date'], sort=True)
+    if tickers is None:
+        ticker_index, tickers = pd.factorize(df['ticker'], sort=True)
+        tickers = np.asarray(tickers).astype(str)
+    else:
+        tickers = np.asarray(tickers).astype(str)
+        ticker_index = np.searchsorted(tickers, df['ticker'].to_numpy().astype(str))
+    dates = np.asarray(dates)
+    matrices = {}
+    for field in fields:
+        if field not in df.columns:
+            continue
+        matrix = np.full((len(dates), len(tickers)), np.nan)
+        matrix[date_index, ticker_index] = df[field].to_numpy(dtype=np.float64, na_value=np.nan)
+        matrices[field] = matrix
+    return Panel(dates, tickers, matrices)
+
+
+def forward_fill(matrix):
+    """
+    Forward fills NaNs down each column (ticker) of a dates x tickers matrix.
+    """
+    rows = np.where(~np.isnan(matrix), np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+# ─────────────────────────────────────────────
+# WEIGHTS
+# Weight functions take {field: 1-D array over tickers} & a boolean mask of investable tickers and
+# return weights over tickers that sum to 1 (0 outside the mask).
+# ─────────────────────────────────────────────
+
+def market_cap_weights(values, mask):
+    caps = np.where(mask, np.nan_to_num(values['market_cap']), 0.0)
+    total = caps.sum()
+    return caps / total if total > 0 else caps
+
+
+def equal_weights(values, mask):
+    count = mask.sum()
+    return mask / count if count else mask.astype(np.float64)
+
+
+WEIGHTS = {
+    "market_cap_weighted": market_cap_weights,
+    "equal_weighted": equal_weights,
+}
+
+
+# ─────────────────────────────────────────────
+# BACKTESTS
+# ─────────────────────────────────────────────
+
+def run_buy_and_hold(panel, weights_fn, initial_portfolio_value=10000):
+    """
+    Buys every ticker at its first available close, weighted by weights_fn evaluated on each ticker's first
+    row, then holds. Prices are carried forward over gaps. Returns a dict of arrays:
+    shares (tickers), position_value (dates x tickers), portfolio_value, daily_return & cum_return (dates,
+    as fractions) and turnover (dates).
+    """
+    close = panel['close']
+    listed = ~np.isnan(close)
+    mask = listed.any(axis=0)
+    first_row = np.argmax(listed, axis=0)
+    columns = np.arange(close.shape[1])
+
+    entry = {field: matrix[first_row, columns] for field, matrix in panel.fields.items()}
+    weights = weights_fn(entry, mask & (entry['close'] > 0))
+    shares = np.divide(weights * initial_portfolio_value, entry['close'], out=np.zeros_like(weights), where=weights > 0)
+
+    position_value = np.nan_to_num(forward_fill(close)) * shares
+    portfolio_value = position_value.sum(axis=1)
+    turnover = np.zeros(len(panel.dates))
+    np.add.at(turnover, first_row[mask], weights[mask])
+    return summarize_values(portfolio_value, initial_portfolio_value, shares=shares, position_value=position_value, turnover=turnover)
+
+
+REBALANCE_FREQUENCIES = ("daily", "weekly", "monthly", "drift")
+
+
+def rebalance_schedule(dates, frequency):
+    """
+    Boolean array flagging the first trading day of each period (the first date is always flagged).
+    "drift" only flags the first date; later rebalances are triggered by the drift threshold.
+    """
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Unknown rebalance frequency '{frequency}', expected one of {REBALANCE_FREQUENCIES}")
+    index = pd.DatetimeIndex(dates)
+    if frequency == "daily":
+        schedule = np.ones(len(index), dtype=bool)
+    elif frequency == "drift":
+        schedule = np.zeros(len(index), dtype=bool)
+    else:
+        periods = index.to_period("W" if frequency == "weekly" else "M").asi8
+        schedule = np.r_[True, periods[1:] != periods[:-1]] if len(periods) else np.zeros(0, dtype=bool)
+    if len(schedule):
+        schedule[0] = True
+    return schedule
+
+
+def run_rebalanced(panel, weights_fn, frequency="monthly", initial_portfolio_value=10000,
+                   commission_bps=1.0, slippage_bps=5.0, drift_threshold=0.05):
+    """
+    Periodically rebalanced portfolio. On each rebalance date the target weights are recomputed from that
+    day's values for the tickers with a close on that day, & the traded value (turnover x portfolio value)
+    pays commission + slippage (in basis points) out of the portfolio. Tickers without a close on a
+    rebalance date are sold at their last price. With frequency="drift" the portfolio is rebalanced whenever
+    any weight drifts more than `drift_threshold` (absolute) from its target.
+
+    Only rebalance dates are visited in Python (every date for "drift", with vector operations across
+    tickers); holdings between rebalances are expanded & valued with array operations. Returns the same
+    arrays as run_buy_and_hold plus costs, with shares as a dates x tickers matrix.
+    """
+    prices = np.nan_to_num(forward_fill(panel['close']))
+    schedule = rebalance_schedule(panel.dates, frequency)
+    result = rebalance(panel, prices, schedule, frequency, weights_fn, np.zeros(panel.shape[1]), float(initial_portfolio_value),
+                       (commission_bps + slippage_bps) / 10000, drift_threshold)
+    return summarize_values(result.pop('portfolio_value'), initial_portfolio_value, **result)
+
+
+def rebalance(panel, prices, schedule, frequency, weights_fn, shares, cash, cost_rate, drift_threshold):
+    """
+    Rebalancing loop of run_rebalanced over a block of dates, starting from holdings (shares, cash) carried in
+    from earlier dates. `prices` are the panel's closes carried forward (0 before a ticker's first close).
+    Returns portfolio_value, shares (dates x tickers), position_value, turnover & costs for the block.
+    """
+    listed = ~np.isnan(panel['close'])
+    candidates = np.arange(len(panel.dates)) if frequency == "drift" else np.flatnonzero(schedule)
+    n_tickers = prices.shape[1]
+    rebalance_rows, held_shares, held_cash, turnovers, costs = [], [shares], [cash], [], []
+
+    for row in candidates:
+        price = prices[row]
+        holdings = shares * price
+        value = holdings.sum() + cash
+        investable = listed[row] & (price > 0)
+        target = weights_fn({field: matrix[row] for field, matrix in panel.fields.items()}, investable)
+        current = holdings / value if value else holdings
+
+        if not schedule[row] and np.abs(current - target).max(initial=0.0) <= drift_threshold:
+            continue
+
+        turnover = np.abs(target - current).sum()
+        cost = value * turnover * cost_rate
+        value -= cost
+        shares = np.divide(target * value, price, out=np.zeros(n_tickers), where=target > 0)
+        cash = value - (shares * price).sum()
+
+        rebalance_rows.append(row)
+        held_shares.append(shares)
+        held_cash.append(cash)
+        turnovers.append(turnover)
+        costs.append(cost)
+
+    # Holdings of each date = holdings set on the latest rebalance on or before it (the carried holdings before any)
+    segment = np.cumsum(np.isin(np.arange(len(panel.dates)), rebalance_rows))
+    shares_matrix = np.asarray(held_shares)[segment]
+    position_value = shares_matrix * prices
+
+    turnover = np.zeros(len(panel.dates))
+    turnover[rebalance_rows] = turnovers
+    cost = np.zeros(len(panel.dates))
+    cost[rebalance_rows] = costs
+    return {
+        "portfolio_value": position_value.sum(axis=1) + np.asarray(held_cash)[segment],
+        "shares": shares_matrix,
+        "position_value": position_value,
+        "turnover": turnover,
+        "costs": cost,
+    }
+
+
+class StreamingBacktest:
+    """
+    Out-of-core buy-and-hold or rebalanced backtest over date-ordered chunks of long-format rows.
+    Only the portfolio state is carried between chunks: shares, cash, each ticker's last close, the last
+    date & the last portfolio value, so memory is bounded by the chunk size rather than the history.
+    Every date must be complete within one chunk (see DatabaseManager.stream_table).
+
+    tickers  - sorted universe of the whole stream
+    entry    - for buy-and-hold (frequency=None): each ticker's first row (date, ticker, close, market_cap, ...),
+               from which the weights are fixed up front exactly as run_buy_and_hold does
+    """
+    def __init__(self, tickers, weights_fn, frequency=None, initial_portfolio_value=10000, entry=None,
+                 commission_bps=1.0, slippage_bps=5.0, drift_threshold=0.05, fields=("close", "market_cap", "volume")):
+        self.tickers = np.asarray(tickers).astype(str)
+        self.weights_fn = weights_fn
+        self.frequency = frequency
+        self.initial_portfolio_value = initial_portfolio_value
+        self.cost_rate = (commission_bps + slippage_bps) / 10000
+        self.drift_threshold = drift_threshold
+        self.fields = fields
+
+        self.last_price = np.full(len(self.tickers), np.nan)
+        self.last_date = None
+        self.last_value = np.nan
+        self.shares = np.zeros(len(self.tickers))
+        self.cash = float(initial_portfolio_value)
+
+        if frequency is None:
+            if entry is None:
+                raise ValueError("Buy-and-hold streaming needs each ticker's first row (entry)")
+            entry = entry.drop_duplicates('ticker', keep='last')
+            values = {field: matrix[0] for field, matrix in pivot_panel(entry.assign(date=0), fields, self.tickers).fields.items()}
+            weights = weights_fn(values, ~np.isnan(values['close']) & (values['close'] > 0))
+            self.shares = np.divide(weights * initial_portfolio_value, values['close'], out=np.zeros_like(weights), where=weights > 0)
+            self.entry_weights = weights
+            self.entry_dates = np.full(len(self.tickers), np.datetime64("NaT"), dtype="datetime64[ns]")
+            self.entry_dates[np.searchsorted(self.tickers, entry['ticker'].to_numpy().astype(str))] = pd.to_datetime(entry['date']).to_numpy()
+            self.cash = 0.0  # Buy-and-hold portfolios are valued on their positions only
+
+    def update(self, chunk):
+        """
+        Advances the backtest over one chunk of rows. Returns (Panel of the chunk, result arrays) in the format
+        of run_buy_and_hold / run_rebalanced, so portfolio_frame & positions_frame apply to each chunk.
+        """
+        panel = pivot_panel(chunk, self.fields, self.tickers)
+        if not len(panel.dates):
+            return panel, None
+        prices = forward_fill(np.vstack([self.last_price, panel['close']]))
+        self.last_price = prices[-1]
+        prices = np.nan_to_num(prices[1:])
+
+        if self.frequency is None:
+            position_value = prices * self.shares
+            turnover = np.zeros(len(panel.dates))
+            rows = np.searchsorted(panel.dates, self.entry_dates)
+            entering = (rows < len(panel.dates)) & (panel.dates[np.minimum(rows, len(panel.dates) - 1)] == self.entry_dates)
+            np.add.at(turnover, rows[entering], self.entry_weights[entering])
+            result = {"portfolio_value": position_value.sum(axis=1), "shares": self.shares,
+                      "position_value": position_value, "turnover": turnover}
+        else:
+            # Prepend the previous chunk's last date so period boundaries are detected across chunks
+            if self.last_date is None:
+                schedule = rebalance_schedule(panel.dates, self.frequency)
+            else:
+                schedule = rebalance_schedule(np.r_[self.last_date, panel.dates], self.frequency)[1:]
+            result = rebalance(panel, prices, schedule, self.frequency, self.weights_fn, self.shares, self.cash,
+                               self.cost_rate, self.drift_threshold)
+            self.shares = result['shares'][-1]
+            self.cash = float(result['portfolio_value'][-1] - result['position_value'][-1].sum())
+
+        portfolio_value = result.pop('portfolio_value')
+        result = summarize_values(portfolio_value, self.initial_portfolio_value, self.last_value, **result)
+        self.last_date = panel.dates[-1]
+        self.last_value = portfolio_value[-1]
+        return panel, result
+
+
+def summarize_values(portfolio_value, initial_portfolio_value, previous_value=np.nan, **arrays):
+    """
+    Adds daily & cumulative returns (as fractions) to a backtest's portfolio value series.
+    `previous_value` is the value on the date before the series (when it continues an earlier chunk).
+    """
+    values = np.r_[previous_value, portfolio_value]
+    daily_return = np.full(len(values), np.nan)
+    np.divide(values[1:], values[:-1], out=daily_return[1:], where=values[:-1] != 0)
+    daily_return = daily_return[1:] - 1
+    return {
+        "portfolio_value": portfolio_value,
+        "daily_return": daily_return,
+        "cum_return": portfolio_value / initial_portfolio_value - 1,
+        **arrays,
+    }
+
+
+def portfolio_frame(panel, result):
+    """
+    Daily portfolio DataFrame (date, portfolio_value, daily_return, cum_return, turnover) with numeric returns.
+    """
+    return pd.DataFrame({
+        "date": panel.dates,
+        "portfolio_value": result['portfolio_value'],
+        "daily_return": result['daily_return'],
+        "cum_return": result['cum_return'],
+        "turnover": result['turnover'],
+    })
+
+
+def positions_frame(panel, result):
+    """
+    Long-format (date, ticker, close, shares, position_value) rows for every stored (date, ticker) observation.
+    """
+    date_index, ticker_index = np.nonzero(~np.isnan(panel['close']))
+    shares = result['shares']
+    shares = shares[date_index, ticker_index] if shares.ndim == 2 else shares[ticker_index]
+    return pd.DataFrame({
+        "date": panel.dates[date_index],
+        "ticker": panel.tickers[ticker_index],
+        "close": panel['close'][date_index, ticker_index],
+        "shares": shares,
+        "position_value": result['position_value'][date_index, ticker_index],
+    })
@@ -0,0 +1,45 @@
+"""
+Measures DatabaseManager.procure_data against a local rate limited stand-in for polygon.io.
+
+    python -m benchmarks.bench_fetch --rpm 600 --latency 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+from logger import Logger
+from database_manager import DatabaseManager
+from benchmarks.mock_polygon import MockPolygonServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rpm", type=int, default=600, help="Requests per minute allowed by the stand-in server.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of simulated server latency per request.")
+    parser.add_argument("--tickers", type=int, default=6)
+    parser.add_argument("--start-date", default="2025-09-22")
+    parser.add_argument("--end-date", default="2025-09-26")
+    args = parser.parse_args()
+
+    logger = Logger("Aurelius_bench_fetch", "0")
+    tickers = [f"T{i:03d}" for i in range(args.tickers)]
+
+    with tempfile.TemporaryDirectory() as tmp, MockPolygonServer(requests_per_minute=args.rpm, latency=args.latency) as server:
+        database = os.path.join(tmp, "bench.db")
+        database_manager = DatabaseManager([database], ["ohlcv_daily", "market_caps_daily"], tickers, logger,
+                                           requests_per_minute=args.rpm, base_url=server.url)
+        database_manager.initialize_database()
+        unique_dates = database_manager.get_unique_dates(args.start_date, args.end_date)
+
+        start = time.perf_counter()
+        database_manager.procure_data(args.start_date, args.end_date, unique_dates)
+        elapsed = time.perf_counter() - start
+
+    stats = server.stats
+    served = stats["requests"] - stats["rate_limited"]
+    print(f"{served} requests in {elapsed:.2f}s ({served / elapsed * 60:.0f}/min, plan {args.rpm}/min) | "
+          f"429s: {stats['rate_limited']} | max in flight: {stats['max_in_flight']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+End-to-end pipeline benchmark on synthetic data: ingest (against the local polygon.io stand-in), join,
+load (SQLite, cold & warm snapshots), every strategy & histogram plotting (cold & incremental).
+
+    python -m benchmarks.bench_pipeline --tickers 50 --days 250 --bar-sizes day hour
+    python -m benchmarks.bench_pipeline --tickers 500 --days 2500 --populate --compare benchmarks/results/<previous>.json
+
+Each stage's seconds, items processed & throughput, the Python heap peak during the stage (tracemalloc, with
+--trace-memory) & the process' peak RSS are written as JSON together with the git commit & library versions,
+so runs of different versions can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from logger import Logger
+from database_manager import DatabaseManager
+from snapshot_cache import SnapshotCache
+from strategy_manager import StrategyManager
+from chart_renderer import ChartRenderer
+from benchmarks.mock_polygon import MockPolygonServer
+from benchmarks.synthetic_data import TIMESPAN_TABLES, ticker_universe, trading_window, populate
+
+JOINED_TABLE = "ohlcv_market_caps_daily"
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is in bytes on macOS & KiB on Linux
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def count_rows(databases, table):
+    total = 0
+    for database in databases:
+        connection = sqlite3.connect(database)
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+        total += connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] if exists else 0
+        connection.close()
+    return total
+
+
+class Stages:
+    """
+    Collects one record per benchmarked stage: the Logger span (seconds, count, per_second) plus memory.
+    """
+    def __init__(self, logger, trace_memory=False):
+        self.logger = logger
+        self.trace_memory = trace_memory
+        self.records = []
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name, **fields):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        with self.logger.span(name, **fields) as span:
+            yield span
+            if self.trace_memory:
+                span.fields["peak_traced_mib"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+            span.fields["max_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 2**20, 3)
+        self.records.append(span.record())
+
+
+def compare(previous, current, tolerance, min_seconds=0.05):
+    """
+    Prints seconds & memory of every stage present in both result files. Returns the regressed stages: slower,
+    or using more memory, than the previous run by more than `tolerance` (0.1 = 10%). Stages faster than
+    `min_seconds` in both runs are too noisy to flag as slower.
+    """
+    before = {record["span"]: record for record in previous["stages"]}
+    regressions = []
+    print(f"\n{'stage':<36}{'seconds':>12}{'previous':>12}{'change':>10}{'memory MiB':>14}{'previous':>12}")
+    for record in current["stages"]:
+        old = before.get(record["span"])
+        if old is None:
+            continue
+        memory_key = "peak_traced_mib" if "peak_traced_mib" in record and "peak_traced_mib" in old else "max_rss_mib"
+        change = record["seconds"] / old["seconds"] - 1 if old["seconds"] else 0.0
+        memory_change = record[memory_key] / old[memory_key] - 1 if old.get(memory_key) else 0.0
+        regressed = (change > tolerance and max(record["seconds"], old["seconds"]) >= min_seconds) or memory_change > tolerance
+        if regressed:
+            regressions.append(record["span"])
+        print(f"{record['span']:<36}{record['seconds']:>12.3f}{old['seconds']:>12.3f}{change:>+10.1%}"
+              f"{record[memory_key]:>14.1f}{old.get(memory_key, float('nan')):>12.1f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=250, help="Trading days of history, ending at --end-date.")
+    parser.add_argument("--end-date", default="2025-09-26")
+    parser.add_argument("--bar-sizes", nargs="+", default=["day"], choices=sorted(TIMESPAN_TABLES), help="OHLCV tables to fill.")
+    parser.add_argument("--shards", type=int, default=1, help="Number of database files the tickers are sharded across.")
+    parser.add_argument("--populate", action="store_true", help="Write synthetic rows straight into SQLite instead of ingesting over HTTP.")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute allowed by the stand-in server (0 = unlimited).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of simulated server latency per request.")
+    parser.add_argument("--market-cap-method", default="snapshots", choices=["snapshots", "daily"])
+    parser.add_argument("--strategies", nargs="+", default=None, help="Strategies to benchmark (default: all).")
+    parser.add_argument("--plot-tickers", type=int, default=5, help="Tickers whose histograms are rendered (0 = skip plotting).")
+    parser.add_argument("--max-workers", type=int, default=None, help="Processes used for plotting.")
+    parser.add_argument("--trace-memory", action="store_true", help="Record each stage's Python heap peak (slows the run).")
+    parser.add_argument("--label", default=None, help="Version label stored with the results (default: git commit).")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/pipeline_<label>_<time>.json, git-ignored).")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown or memory growth reported as a regression.")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Stages faster than this are not flagged as slower.")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    label = args.label or commit or "unknown"
+    created = datetime.now(timezone.utc)
+    output = os.path.abspath(args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                                         f"pipeline_{label}_{created.strftime('%Y%m%d_%H%M%S')}.json"))
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    tickers = ticker_universe(args.tickers)
+    start_date, end_date = trading_window(args.days, args.end_date)
+    tables = [TIMESPAN_TABLES[bar_size] for bar_size in args.bar_sizes]
+    if "ohlcv_daily" in tables:
+        tables.append("market_caps_daily")  # Joined with ohlcv_daily into the table the strategies run on
+    print(f"{len(tickers)} tickers x {args.days} trading days ({start_date} to {end_date}), tables: {', '.join(tables)}, "
+          f"{args.shards} shard(s), {'populated directly' if args.populate else 'ingested over HTTP'}")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, MockPolygonServer(requests_per_minute=args.rpm or None, latency=args.latency) as server:
+        os.chdir(tmp)  # Databases, snapshots, plots & logs use the same relative names as main.py
+        logger = Logger("Aurelius_bench_pipeline", "0", console_level="warning")
+        stages = Stages(logger, args.trace_memory)
+        try:
+            databases = ["database.db"] if args.shards == 1 else [f"database_{i}.db" for i in range(args.shards)]
+            database_manager = DatabaseManager(databases, tables, tickers, logger, requests_per_minute=args.rpm or None,
+                                               base_url=server.url, market_cap_method=args.market_cap_method)
+            database_manager.initialize_database()
+
+            ### INGEST
+            if args.populate:
+                with stages.measure("populate", tickers=len(tickers), days=args.days) as span:
+                    span.add(sum(populate(database_manager, start_date, end_date).values()))
+            else:
+                unique_dates = database_manager.get_unique_dates(start_date, end_date)
+                with stages.measure("ingest", tickers=len(tickers), days=args.days, rpm=args.rpm, latency=args.latency) as span:
+                    database_manager.procure_data(start_date, end_date, unique_dates)
+                    span.add(sum(count_rows(databases, table) for table in tables))  # Rows stored
+                    span.fields["requests"] = database_manager.client.requests_sent
+                    span.fields["rate_limited"] = server.stats["rate_limited"]
+
+            ### JOIN
+            if "ohlcv_daily" in tables:
+                with stages.measure("join") as span:
+                    database_manager.join_tables()
+                    span.add(count_rows(databases, JOINED_TABLE))
+
+            ### LOAD
+            with stages.measure("load_sqlite") as span:
+                database_tables = database_manager.get_database_tables()
+                span.add(sum(len(database_tables[name]) for name in database_tables))
+            snapshot_cache = SnapshotCache("snapshots", logger)
+            for name in ("load_snapshot_cold", "load_snapshot_warm"):  # Writes the snapshot, then memory-maps it
+                with stages.measure(name) as span:
+                    snapshot_tables = database_manager.get_database_tables(tables=[JOINED_TABLE], snapshot_cache=snapshot_cache)
+                    span.add(sum(len(snapshot_tables[name]) for name in snapshot_tables))
+
+            ### STRATEGIES
+            strategy_manager = StrategyManager(database_tables, logger)
+            joined = next((database_tables[name] for name in database_tables if name.endswith(JOINED_TABLE)), None)
+            if joined is not None:
+                with stages.measure("pivot_panel") as span:
+                    panel = strategy_manager.get_panel(joined)
+                    span.add(len(joined))
+                    span.fields.update(dates=len(panel.dates), tickers=len(panel.tickers))
+                for strategy_name in args.strategies or strategy_manager.strategies:
+                    with stages.measure(f"strategy_{strategy_name}") as span:
+                        strat_df, daily_portfolio = strategy_manager.strategies[strategy_name](joined)
+                        span.add(len(joined))
+
+            ### PLOTTING
+            if args.plot_tickers:
+                plotted = tickers[:args.plot_tickers]
+                plot_tables = [(name, df[df['ticker'].isin(plotted)]) for name, df in database_tables.items()]
+                renderer = ChartRenderer(logger, max_workers=args.max_workers)
+                for name in ("plot_histograms_cold", "plot_histograms_warm"):  # Renders every plot, then skips them all
+                    with stages.measure(name, tickers=len(plotted)) as span:
+                        rendered, skipped = renderer.render(plot_tables)
+                        span.add(rendered + skipped)
+                        span.fields.update(rendered=rendered, skipped=skipped)
+        finally:
+            os.chdir(cwd)
+            logger.close()
+
+    results = {
+        "benchmark": "pipeline",
+        "label": label,
+        "commit": commit,
+        "created": created.isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "stages": stages.records,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+
+    print(f"\n{'stage':<36}{'seconds':>12}{'items':>12}{'items/sec':>14}{'max RSS MiB':>14}")
+    for record in stages.records:
+        print(f"{record['span']:<36}{record['seconds']:>12.3f}{record.get('count', ''):>12}"
+              f"{record.get('per_second') or 0:>14,.0f}{record['max_rss_mib']:>14.1f}")
+    print(f"\nResults written to {output}")
+
+    if compare_path:
+        with open(compare_path) as f:
+            regressions = compare(json.load(f), results, args.tolerance, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares the legacy per-row INSERT + commit pattern with DatabaseManager's bulk executemany path.
+
+    python -m benchmarks.bench_sqlite_writes --rows 1000000 --legacy-rows 20000
+
+The legacy path commits (and fsyncs) once per row, so it is measured on a smaller sample & reported as rows/sec.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from logger import Logger
+from database_manager import DatabaseManager, OHLCV_COLUMNS
+
+DAY_MS = 86_400_000
+
+
+def synthetic_responses(n_rows, rows_per_response=2500, seed=0):
+    """
+    Yields Polygon-shaped aggregates responses totalling n_rows bars.
+    """
+    rng = random.Random(seed)
+    produced = 0
+    ticker_number = 0
+    while produced < n_rows:
+        count = min(rows_per_response, n_rows - produced)
+        results = []
+        for i in range(count):
+            close = rng.uniform(10, 500)
+            results.append({"t": 946_684_800_000 + i * DAY_MS, "o": close, "h": close * 1.01, "l": close * 0.99,
+                            "c": close, "v": rng.randint(1_000, 10_000_000), "vw": close, "n": rng.randint(1, 100_000)})
+        yield {"ticker": f"T{ticker_number:05d}", "resultsCount": count, "request_id": f"{ticker_number:032x}", "results": results}
+        produced += count
+        ticker_number += 1
+
+
+def legacy_insert(database, table, responses):
+    """
+    The original procure_data write pattern: one cursor, datetime.now(), INSERT & commit per row.
+    """
+    connection = sqlite3.connect(database)
+    placeholders = ", ".join("?" for _ in OHLCV_COLUMNS)
+    rows = 0
+    for data in responses:
+        for result in data['results']:
+            dt = datetime.fromtimestamp(result['t'] / 1000)
+            cursor = connection.cursor()
+            cursor.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(OHLCV_COLUMNS)}) VALUES ({placeholders})", (
+                result['t'], dt.strftime('%Y-%m-%d %H:%M:%S'), dt.strftime('%Y-%m-%d'), data['ticker'],
+                result['o'], result['h'], result['l'], result['c'], result['v'], result['vw'], result['n'],
+                data['resultsCount'], data['request_id'], str(datetime.now())))
+            connection.commit()
+            rows += 1
+    connection.close()
+    return rows
+
+
+def bulk_insert(database_manager, database, table, responses):
+    connection = database_manager.connect(database)
+    rows = 0
+    for data in responses:
+        rows += database_manager.write_rows(connection, table, OHLCV_COLUMNS, database_manager.ohlcv_rows(data, str(datetime.now())))
+    connection.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows written through the bulk path.")
+    parser.add_argument("--legacy-rows", type=int, default=20_000, help="Rows written through the legacy per-row path.")
+    args = parser.parse_args()
+
+    logger = Logger("Aurelius_bench_sqlite_writes", "0")
+    table = "ohlcv_daily"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, n_rows in (("legacy", args.legacy_rows), ("bulk", args.rows)):
+            database = os.path.join(tmp, f"{label}.db")
+            database_manager = DatabaseManager([database], [table], [], logger)
+            database_manager.initialize_database()
+            if label == "legacy":
+                # The legacy path ran on SQLite's defaults: rollback journal & synchronous=FULL
+                connection = sqlite3.connect(database)
+                connection.execute("PRAGMA journal_mode=DELETE;")
+                connection.close()
+
+            start = time.perf_counter()
+            if label == "legacy":
+                written = legacy_insert(database, table, synthetic_responses(n_rows))
+            else:
+                written = bulk_insert(database_manager, database, table, synthetic_responses(n_rows))
+            elapsed = time.perf_counter() - start
+            results[label] = written / elapsed
+            print(f"{label:>6}: {written:>9,} rows in {elapsed:8.2f}s -> {results[label]:>12,.0f} rows/sec")
+
+        print(f"speedup: {results['bulk'] / results['legacy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
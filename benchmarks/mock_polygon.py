@@ -0,0 +1,209 @@
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from trading_calendar import is_trading_day
+
+
+class RateLimiter:
+    """
+    Server side sliding window per API key: at most `requests_per_minute` requests in any 60 seconds.
+    Mirrors how polygon.io rejects requests over the plan budget, bursts included.
+    """
+    def __init__(self, requests_per_minute, window=60.0):
+        self.limit = requests_per_minute
+        self.window = window
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def allow(self, api_key):
+        """
+        Returns (allowed, retry_after_seconds).
+        """
+        with self.lock:
+            now = time.monotonic()
+            sent = self.requests.setdefault(api_key, deque())
+            while sent and sent[0] <= now - self.window:
+                sent.popleft()
+            if len(sent) < self.limit:
+                sent.append(now)
+                return True, 0.0
+            return False, sent[0] + self.window - now
+
+
+def _seed(*parts):
+    return zlib.crc32("|".join(str(part) for part in parts).encode())
+
+
+BAR_MINUTES = {"minute": 1, "hour": 60, "day": 1440}
+
+
+def ohlcv_results(ticker, start_date, end_date, multiplier=1, timespan="day"):
+    """
+    Deterministic synthetic bars for every NYSE trading day between two YYYY-MM-DD dates.
+    Intraday bars cover 08:00-24:00 UTC (roughly the 04:00-20:00 ET extended session).
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    step = BAR_MINUTES[timespan] * multiplier
+    results = []
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            rng = random.Random(_seed(ticker, day.date(), multiplier, timespan))
+            base = 20 + _seed(ticker) % 300 + random.Random(_seed(ticker, day.date())).uniform(-5, 5)
+            if timespan == "day":
+                bar_starts = [day + timedelta(hours=4)]
+            else:
+                bar_starts = [day + timedelta(hours=8, minutes=m) for m in range(0, 16 * 60, step)]
+            for bar_start in bar_starts:
+                close = base * rng.uniform(0.995, 1.005) if timespan != "day" else base
+                open_ = close * rng.uniform(0.98, 1.02)
+                results.append({
+                    "t": int(bar_start.timestamp() * 1000),
+                    "o": round(open_, 4),
+                    "h": round(max(open_, close) * rng.uniform(1.0, 1.02), 4),
+                    "l": round(min(open_, close) * rng.uniform(0.98, 1.0), 4),
+                    "c": round(close, 4),
+                    "v": rng.randint(1_000_000, 50_000_000),
+                    "vw": round((open_ + close) / 2, 4),
+                    "n": rng.randint(10_000, 200_000),
+                })
+        day += timedelta(days=1)
+    return results
+
+
+def reference_result(ticker, date):
+    """
+    Deterministic synthetic ticker reference data (shares outstanding & market cap).
+    Share counts change at the start of every calendar quarter.
+    """
+    day = datetime.strptime(date, "%Y-%m-%d")
+    quarter = day.year * 4 + (day.month - 1) // 3
+    shares = 1_000_000_000 + _seed(ticker, "shares") % 2_000_000_000 + quarter * 1_000
+    close = ohlcv_results(ticker, date, date)
+    price = close[0]["c"] if close else 20 + _seed(ticker) % 300
+    return {
+        "ticker": ticker,
+        "share_class_shares_outstanding": shares,
+        "weighted_shares_outstanding": shares,
+        "market_cap": shares * price,
+    }
+
+
+class MockPolygonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        api_key = query.get("apiKey", [""])[0]
+
+        allowed, retry_after = server.limiter.allow(api_key) if server.limiter else (True, 0.0)
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            if not allowed:
+                server.stats["rate_limited"] += 1
+                self.send_json(429, {"status": "ERROR", "error": "You've exceeded the maximum requests per minute."},
+                               {"Retry-After": f"{retry_after:.3f}"})
+                return
+            server.in_flight += 1
+            server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.in_flight)
+
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            segments = parts.path.strip("/").split("/")
+            request_id = uuid.uuid4().hex
+
+            # /v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{from}/{to}?limit=&cursor=
+            if segments[:3] == ["v2", "aggs", "ticker"] and len(segments) == 9:
+                ticker, multiplier, timespan, start_date, end_date = segments[3], int(segments[5]), segments[6], segments[7], segments[8]
+                results = ohlcv_results(ticker, start_date, min(end_date, server.published_through or end_date), multiplier, timespan)
+                limit = min(int(query.get("limit", ["5000"])[0]), server.max_results)
+                offset = int(query.get("cursor", ["0"])[0])
+                page = results[offset:offset + limit]
+                payload = {"ticker": ticker, "status": "OK", "request_id": request_id,
+                           "resultsCount": len(page), "results": page}
+                if offset + limit < len(results):
+                    payload["next_url"] = f"http://{self.headers['Host']}{parts.path}?cursor={offset + limit}&limit={limit}"
+                self.send_json(200, payload)
+
+            # /v3/reference/tickers/{ticker}?date=YYYY-MM-DD
+            elif segments[:3] == ["v3", "reference", "tickers"] and len(segments) == 4:
+                ticker = segments[3]
+                date = query.get("date", [datetime.now(timezone.utc).strftime("%Y-%m-%d")])[0]
+                self.send_json(200, {"status": "OK", "request_id": request_id, "results": reference_result(ticker, date)})
+
+            else:
+                self.send_json(404, {"status": "NOT_FOUND", "request_id": request_id})
+        finally:
+            with server.stats_lock:
+                server.in_flight -= 1
+
+
+class MockPolygonServer:
+    """
+    Local stand-in for api.polygon.io, served from a background thread.
+
+        with MockPolygonServer(requests_per_minute=300) as server:
+            DatabaseManager(..., base_url=server.url)
+
+    published_through - last date with bars (None = every date), e.g. yesterday to answer like the API before today's close
+    """
+    def __init__(self, host="127.0.0.1", port=0, requests_per_minute=None, latency=0.0, max_results=50000,
+                 published_through=None):
+        self.httpd = ThreadingHTTPServer((host, port), MockPolygonHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        self.httpd.latency = latency
+        self.httpd.max_results = max_results
+        self.httpd.published_through = published_through  # May be moved forward while serving (e.g. past the close)
+        self.httpd.stats = {"requests": 0, "rate_limited": 0, "max_in_flight": 0}
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.in_flight = 0
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
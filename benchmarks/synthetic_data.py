@@ -0,0 +1,70 @@
+"""
+Synthetic market data for benchmarks: ticker universes, trading day windows & databases filled with bars.
+
+The bars are the same deterministic series MockPolygonServer serves, so a database populated here holds the
+rows procure_data would store from the stand-in server, without the HTTP round trips.
+"""
+from datetime import date, timedelta
+from database_manager import OHLCV_COLUMNS, OHLCV_TABLES, MARKET_CAP_COLUMNS
+from trading_calendar import trading_days
+from benchmarks.mock_polygon import ohlcv_results, reference_result
+
+TIMESPAN_TABLES = {timespan: table for table, (multiplier, timespan) in OHLCV_TABLES.items()}  # "day" -> "ohlcv_daily"
+
+
+def ticker_universe(n_tickers):
+    """
+    n synthetic ticker symbols: T0000, T0001, ...
+    """
+    return [f"T{i:04d}" for i in range(n_tickers)]
+
+
+def trading_window(n_days, end_date="2025-09-26"):
+    """
+    (start_date, end_date) spanning the last n NYSE trading days up to & including end_date.
+    """
+    end = date.fromisoformat(end_date)
+    start = end - timedelta(days=n_days * 7 // 5 + 30)  # Weekends & holidays, with room to spare
+    days = trading_days(start.isoformat(), end_date)
+    while len(days) < n_days:
+        start -= timedelta(days=365)
+        days = trading_days(start.isoformat(), end_date)
+    return days[-n_days], days[-1]
+
+
+def responses(tickers, start_date, end_date, multiplier=1, timespan="day"):
+    """
+    Yields one Polygon-shaped aggregates response per ticker.
+    """
+    for ticker in tickers:
+        results = ohlcv_results(ticker, start_date, end_date, multiplier, timespan)
+        yield {"ticker": ticker, "status": "OK", "resultsCount": len(results), "request_id": f"synthetic-{ticker}", "results": results}
+
+
+def populate(database_manager, start_date, end_date, etl_datetime="synthetic"):
+    """
+    Writes synthetic bars & daily market caps for every ticker of a DatabaseManager straight into its databases
+    (in each ticker's shard), for the tables it was created with. Returns {table: rows written}.
+    """
+    written = {}
+    days = trading_days(start_date, end_date)
+    for database, tickers in database_manager.tickers_by_database().items():
+        if not tickers:
+            continue
+        connection = database_manager.connect(database)
+        for table in database_manager.tables:
+            if table in OHLCV_TABLES:
+                multiplier, timespan = database_manager.intervals[table]
+                rows = 0
+                for data in responses(tickers, start_date, end_date, multiplier, timespan):
+                    rows += database_manager.write_rows(connection, table, OHLCV_COLUMNS, database_manager.ohlcv_rows(data, etl_datetime))
+            elif table == "market_caps_daily":
+                rows = database_manager.write_rows(connection, table, MARKET_CAP_COLUMNS, [
+                    database_manager.market_cap_row(day, {"request_id": f"synthetic-{ticker}", "results": reference_result(ticker, day)}, etl_datetime)
+                    for ticker in tickers for day in days
+                ])
+            else:
+                continue
+            written[table] = written.get(table, 0) + rows
+        connection.close()
+    return written
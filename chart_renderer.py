@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+EXCLUDED_COLUMNS = {"id", "timestamp", "resultsCount"}  # Row ids & request metadata, meaningless as distributions
+MANIFEST = "manifest.json"
+
+_FIGURE = {}  # Per-process figure & axes reused for every plot rendered by that process
+
+
+def histogram_bins(df, columns, bins=30):
+    """
+    Per-ticker density histograms of several columns in one vectorized pass: one groupby for every ticker's
+    min/max/count of every column, then one bincount per column over (ticker, bin). Bins span each ticker's
+    range like plt.hist (a constant column gets the range value ± 0.5). Returns (tickers, {column: (left
+    edges (tickers x bins), bin widths (tickers), densities (tickers x bins), counts (tickers))}).
+    """
+    codes, tickers = pd.factorize(df['ticker'], sort=True)
+    values = df[list(columns)].apply(pd.to_numeric, errors='coerce').astype(np.float64)
+    values = values.where(np.isfinite(values))
+    limits = values.groupby(codes).agg(['min', 'max', 'count']).reindex(range(len(tickers)))
+
+    histograms = {}
+    for column in columns:
+        low, high, count = (limits[(column, stat)].to_numpy(dtype=np.float64) for stat in ('min', 'max', 'count'))
+        constant = low == high
+        low, high = np.where(constant, low - 0.5, low), np.where(constant, high + 0.5, high)
+        width = (high - low) / bins
+
+        x = values[column].to_numpy()
+        valid = ~np.isnan(x)
+        rows = codes[valid]
+        index = np.clip(((x[valid] - low[rows]) / width[rows]).astype(np.int64), 0, bins - 1)
+        counts = np.bincount(rows * bins + index, minlength=len(tickers) * bins).reshape(len(tickers), bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            density = counts / (count * width)[:, None]
+        histograms[column] = (low[:, None] + width[:, None] * np.arange(bins), width, density, count)
+    return np.asarray(tickers).astype(str), histograms
+
+
+def _init_figure():
+    """
+    Process pool initializer: one headless Agg figure per process, cleared & reused for every plot.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    _FIGURE['figure'], _FIGURE['axes'] = plt.subplots(figsize=(16, 9))
+
+
+def _render(jobs):
+    """
+    Renders a batch of (path, title, xlabel, left edges, width, density) histograms. Returns the paths written.
+    The bars are drawn once & then only moved & resized, which is much cheaper than clearing the axes.
+    """
+    if not _FIGURE:
+        _init_figure()
+    figure, axes = _FIGURE['figure'], _FIGURE['axes']
+    written = []
+    for path, title, xlabel, left, width, density in jobs:
+        bars = _FIGURE.get('bars')
+        if bars is None or len(bars.patches) != len(left):
+            axes.clear()
+            bars = _FIGURE['bars'] = axes.bar(left, density, width=width, align='edge', color='black', alpha=0.7)
+        else:
+            for patch, x, height in zip(bars.patches, left, density):
+                patch.set_x(x)
+                patch.set_width(width)
+                patch.set_height(height)
+            axes.relim()
+            axes.autoscale_view()
+        axes.set_title(title)
+        axes.set_xlabel(xlabel)
+        axes.set_ylabel('pct')
+        figure.tight_layout()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        figure.savefig(path, pil_kwargs={"compress_level": 1})
+        written.append(path)
+    return written
+
+
+class ChartRenderer:
+    """
+    Incremental, parallel histogram rendering for plot_histograms.
+    Bins are computed for all tickers & columns of a table at once, every plot's inputs (bins, densities &
+    labels) are hashed, & only plots whose hash differs from the one recorded in <directory>/manifest.json
+    (or whose PNG is missing) are rendered, in batches across a process pool.
+    """
+    def __init__(self, logger, directory="plots", bins=30, max_workers=None, batch_size=64):
+        self.logger = logger
+        self.directory = directory
+        self.bins = bins
+        self.max_workers = max_workers or os.cpu_count()
+        self.batch_size = batch_size
+
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, MANIFEST)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+
+    def plan(self, df_name, df):
+        """
+        Yields (path, hash, job) for every (ticker, numeric column) histogram of one table.
+        """
+        columns = [column for column in df.select_dtypes(include='number').columns if column not in EXCLUDED_COLUMNS]
+        if 'ticker' not in df.columns or not columns:
+            return
+        tickers, histograms = histogram_bins(df, columns, self.bins)
+        for column, (left, width, density, count) in histograms.items():
+            for i, ticker in enumerate(tickers):
+                if not count[i]:
+                    continue
+                path = os.path.join(self.directory, df_name, ticker, f"{df_name}_{column}_{ticker}_hist.png")
+                title = f'{column} in {df_name} for {ticker}'
+                digest = hashlib.sha256(title.encode())
+                digest.update(left[i].tobytes())
+                digest.update(density[i].tobytes())
+                yield path, digest.hexdigest(), (path, title, column, left[i], width[i], density[i])
+
+
+    def render(self, tables):
+        """
+        Renders the histograms of every (table name, DataFrame) in `tables`, skipping unchanged plots.
+        Returns (rendered, skipped) counts.
+        """
+        start = time.perf_counter()
+        manifest = self.read_manifest()
+        jobs, hashes, skipped = [], {}, 0
+        for df_name, df in tables:
+            for path, digest, job in self.plan(df_name, df):
+                if manifest.get(path) == digest and os.path.exists(path):
+                    skipped += 1
+                    continue
+                jobs.append(job)
+                hashes[path] = digest
+
+        self.logger.output(f"Rendering {len(jobs)} histograms ({skipped} unchanged, skipped) across {self.max_workers} processes...")
+        batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+        if len(batches) > 1 and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_figure) as executor:
+                written = [path for paths in executor.map(_render, batches) for path in paths]
+        else:
+            written = [path for batch in batches for path in _render(batch)]
+
+        manifest.update({path: hashes[path] for path in written})
+        self.write_manifest(manifest)
+        self.logger.output(f"Histograms stored in {self.directory}/: {len(written)} rendered, {skipped} unchanged "
+                           f"({time.perf_counter() - start:.2f}s).")
+        return len(written), skipped
@@ -0,0 +1,436 @@
+import copy
+import json
+import signal
+import threading
+from datetime import datetime, time, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+from logger import Logger
+from database_manager import DatabaseManager
+from response_cache import ResponseCache
+from backtest_engine import StreamingBacktest, pivot_panel, portfolio_frame, WEIGHTS
+from sweep_runner import resolve_strategy
+from trading_calendar import is_trading_day, trading_days
+
+JOINED_TABLE = "ohlcv_market_caps_daily"
+PRICE_FIELDS = ("open", "high", "low", "close", "volume", "market_cap")
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+MARKET_CLOSE = time(16, 0)
+
+
+def next_update(now, delay=timedelta(minutes=30)):
+    """
+    The first NYSE close + `delay` after `now` (an aware datetime), in market time.
+    """
+    now = now.astimezone(MARKET_TIMEZONE)
+    day = now.date()
+    while True:
+        run = datetime.combine(day, MARKET_CLOSE, MARKET_TIMEZONE) + delay
+        if is_trading_day(day) and run > now:
+            return run
+        day += timedelta(days=1)
+
+
+def series_json(frame, **fields):
+    """
+    Column-oriented JSON of a DataFrame with a 'date' column: {**fields, "date": [...], column: [...], ...}.
+    NaN becomes null.
+    """
+    payload = {**fields, "date": np.datetime_as_string(frame['date'].to_numpy(dtype="datetime64[ns]"), unit="D").tolist()}
+    for column in frame.columns.drop('date'):
+        values = frame[column].to_numpy(dtype=np.float64)
+        payload[column] = [None if value != value else value for value in values.tolist()]
+    return json.dumps(payload).encode()
+
+
+class QueryCache:
+    """
+    Serialized query responses, each tagged with the tickers it depends on (None = every ticker) & the last
+    date it covers (None = open ended). Updated (ticker, date) keys only drop the responses they can change.
+    """
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, body, tickers=None, end=None):
+        self.entries[key] = (body, tickers, end)
+
+    def invalidate(self, earliest):
+        """
+        Drops every response covering a date on or after the earliest updated date of one of its tickers.
+        `earliest` is {ticker: earliest updated date}. Returns the number of responses dropped.
+        """
+        first = min(earliest.values()) if earliest else None
+        stale = []
+        for key, (body, tickers, end) in self.entries.items():
+            updated = first if tickers is None else min((earliest[ticker] for ticker in tickers if ticker in earliest), default=None)
+            if updated is not None and (end is None or updated <= end):
+                stale.append(key)
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class PanelCache:
+    """
+    The joined table held in memory, with its dates x tickers Panel & every strategy's daily portfolio.
+
+    apply() patches it with the (ticker, date) keys an incremental join updated: only those tickers' rows from
+    their earliest updated date are re-read from SQLite. When the update only appends dates after the last
+    cached one (the daily case), each strategy's StreamingBacktest is advanced over the new rows; corrections
+    to earlier dates or new tickers rerun the strategies from the start. New state is computed first & then
+    swapped in under `lock` together with the invalidation of the responses it makes stale, so readers never
+    see a mix of old & new data.
+    """
+    def __init__(self, database_manager, strategies, logger, initial_portfolio_value=10000, table=JOINED_TABLE):
+        self.database_manager = database_manager
+        self.strategies = strategies
+        self.logger = logger
+        self.initial_portfolio_value = initial_portfolio_value
+        self.table = table
+        self.lock = threading.RLock()
+        self.responses = QueryCache()
+        self.df = None
+        self.panel = None  # Built on the first price query after every update
+        self.backtests = {}
+        self.portfolios = {}
+
+
+    def read(self, tickers=None, start_date=None):
+        return self.database_manager.load_shards(self.database_manager.databases, self.table, tickers=tickers, start_date=start_date)
+
+
+    def run_strategies(self, df):
+        """
+        Runs every strategy over the whole table. Returns ({strategy: StreamingBacktest}, {strategy: daily portfolio}).
+        """
+        tickers = np.asarray(df['ticker'].cat.categories).astype(str)
+        entry = df[df['date'] == df.groupby('ticker', observed=True)['date'].transform('min')]
+        backtests, portfolios = {}, {}
+        for name in self.strategies:
+            weighting, frequency = resolve_strategy(name)
+            backtests[name] = StreamingBacktest(tickers, WEIGHTS[weighting], frequency, self.initial_portfolio_value,
+                                                entry if frequency is None else None)
+            portfolios[name] = self.advance(backtests[name], df)
+        return backtests, portfolios
+
+
+    @staticmethod
+    def advance(backtest, rows):
+        """
+        Daily portfolio rows of a StreamingBacktest advanced over `rows` (with costs for rebalanced strategies).
+        """
+        panel, result = backtest.update(rows)
+        if result is None:
+            return pd.DataFrame(columns=["date", "portfolio_value", "daily_return", "cum_return", "turnover"])
+        daily_portfolio = portfolio_frame(panel, result)
+        if 'costs' in result:
+            daily_portfolio['costs'] = result['costs']
+        return daily_portfolio
+
+
+    def load(self):
+        """
+        Reads the whole table & runs every strategy on it.
+        """
+        df = self.read()
+        backtests, portfolios = self.run_strategies(df) if len(df) else ({}, {})
+        with self.lock:
+            self.df, self.panel, self.backtests, self.portfolios = df, None, backtests, portfolios
+            self.responses = QueryCache()
+        self.logger.output(f"Loaded {len(df)} rows of {self.table} & {len(portfolios)} strategies into memory.")
+
+
+    def apply(self, keys):
+        """
+        Patches the cache with updated (ticker, date) keys. Returns {ticker: earliest updated date}.
+        """
+        updated = pd.DataFrame(keys, columns=['ticker', 'date'])
+        earliest = pd.to_datetime(updated['date']).groupby(updated['ticker']).min()
+        earliest = {ticker: date.to_datetime64() for ticker, date in earliest.items()}
+        if self.df is None or not len(self.df):
+            self.load()
+            return earliest
+
+        tickers = sorted(earliest)
+        first = min(earliest.values())
+        fresh = self.read(tickers, pd.Timestamp(first).strftime('%Y-%m-%d'))
+        cached = self.df
+        appended = first > cached['date'].max().to_datetime64() and set(tickers) <= set(cached['ticker'].cat.categories)
+
+        # One categorical dtype over cached & fresh tickers, so the patched column stays categorical
+        categories = sorted(set(cached['ticker'].cat.categories) | set(fresh['ticker'].cat.categories))
+        stale = cached['ticker'].isin(tickers).to_numpy() & (cached['date'] >= first).to_numpy()
+        df = pd.concat([part.assign(ticker=part['ticker'].cat.set_categories(categories)) for part in (cached[~stale], fresh)],
+                       ignore_index=True)
+
+        if appended:
+            backtests = {name: copy.deepcopy(backtest) for name, backtest in self.backtests.items()}  # Cached ones stay intact on failure
+            portfolios = {name: pd.concat([self.portfolios[name], self.advance(backtests[name], fresh)], ignore_index=True)
+                          for name in self.strategies}
+        else:
+            backtests, portfolios = self.run_strategies(df)
+
+        with self.lock:
+            self.df, self.panel, self.backtests, self.portfolios = df, None, backtests, portfolios
+            dropped = self.responses.invalidate(earliest)
+        self.logger.output(f"Patched {len(fresh)} rows for {len(tickers)} tickers from {pd.Timestamp(first):%Y-%m-%d} "
+                           f"({'appended' if appended else 'strategies rerun'}), {dropped} cached responses dropped.")
+        return earliest
+
+
+    def respond(self, key, build, tickers=None, end=None):
+        """
+        The cached response for `key`, or build() stored under it (see QueryCache for tickers & end).
+        """
+        with self.lock:
+            body = self.responses.get(key)
+            if body is None:
+                body = build()
+                self.responses.put(key, body, tickers, end)
+            return body
+
+
+    def portfolio(self, strategy, start=None, end=None):
+        """
+        JSON daily portfolio series of one strategy between two dates (inclusive). Raises KeyError for unknown strategies.
+        """
+        frame = self.portfolios[strategy]
+        dates = frame['date'].to_numpy(dtype="datetime64[ns]")
+        first = np.searchsorted(dates, start, side="left") if start is not None else 0
+        last = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+        return series_json(frame.iloc[first:last], strategy=strategy)
+
+
+    def prices(self, ticker, start=None, end=None):
+        """
+        JSON daily prices & market caps of one ticker between two dates (inclusive). Raises KeyError for unknown tickers.
+        """
+        if self.panel is None:
+            self.panel = pivot_panel(self.df, PRICE_FIELDS)
+        panel = self.panel
+        column = np.searchsorted(panel.tickers, ticker)
+        if column == len(panel.tickers) or panel.tickers[column] != ticker:
+            raise KeyError(ticker)
+        dates = panel.dates.astype("datetime64[ns]")
+        first = np.searchsorted(dates, start, side="left") if start is not None else 0
+        last = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+        listed = ~np.isnan(panel['close'][first:last, column])
+        frame = pd.DataFrame({"date": dates[first:last][listed],
+                              **{field: matrix[first:last, column][listed] for field, matrix in panel.fields.items()}})
+        return series_json(frame, ticker=ticker)
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """
+    Localhost query interface:
+        GET  /health                                      state of the cache & the update schedule
+        GET  /strategies                                  names of the cached strategies
+        GET  /portfolio/<strategy>?start=YYYY-MM-DD&end=  daily portfolio series
+        GET  /prices/<ticker>?start=YYYY-MM-DD&end=       daily prices & market caps
+        POST /update                                      runs an incremental update now (in the background)
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive, so dashboards polling the daemon reuse their connection
+    disable_nagle_algorithm = True  # Headers & body are separate writes; Nagle + delayed ACKs would add ~40ms
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, default=str).encode())
+
+    def do_GET(self):
+        service = self.server.service
+        cache = service.cache
+        parts = urlsplit(self.path)
+        segments = parts.path.strip("/").split("/")
+        query = parse_qs(parts.query)
+        try:
+            start, end = (np.datetime64(query[name][0], "ns") if name in query else None for name in ("start", "end"))
+        except ValueError:
+            self.send_json(400, {"error": "start & end must be YYYY-MM-DD dates"})
+            return
+
+        try:
+            if segments == ["health"]:
+                self.send_json(200, service.health())
+            elif segments == ["strategies"]:
+                self.send_json(200, {"strategies": sorted(cache.portfolios)})
+            elif len(segments) == 2 and segments[0] == "portfolio":
+                self.send_body(200, cache.respond(self.path, lambda: cache.portfolio(segments[1], start, end), None, end))
+            elif len(segments) == 2 and segments[0] == "prices":
+                self.send_body(200, cache.respond(self.path, lambda: cache.prices(segments[1], start, end), (segments[1],), end))
+            else:
+                self.send_json(404, {"error": f"Unknown path {parts.path}"})
+        except KeyError as ke:
+            self.send_json(404, {"error": f"Not in cache: {ke}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path.strip("/") == "update":
+            self.server.service.wake.set()
+            self.send_json(202, {"status": "update scheduled"})
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+
+class Daemon:
+    """
+    Resident mode of the pipeline: keeps the joined table & strategy results warm in memory, updates them
+    incrementally after every NYSE close & answers queries over HTTP on localhost from the cache.
+
+    An update procures only missing trading days (incremental procure_data), refreshes the join incrementally
+    & hands the updated (ticker, date) keys to the PanelCache, which patches the data & results & drops only the
+    cached responses those keys can change.
+    """
+    def __init__(self, database_manager, logger, start_date, strategies, host="127.0.0.1", port=8765,
+                 update_delay=timedelta(minutes=30), initial_portfolio_value=10000):
+        self.database_manager = database_manager
+        self.logger = logger
+        self.start_date = start_date
+        self.update_delay = update_delay
+        self.cache = PanelCache(database_manager, strategies, logger, initial_portfolio_value)
+        self.last_update = None
+        self.next_update = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.httpd = ThreadingHTTPServer((host, port), DaemonHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def update(self):
+        """
+        Incremental procurement up to today & incremental join, then the cache is patched with the updated keys.
+        Returns the number of (ticker, date) keys updated.
+        """
+        end_date = datetime.now(MARKET_TIMEZONE).strftime('%Y-%m-%d')
+        with self.logger.span("update", end_date=end_date) as span:
+            self.database_manager.procure_data(self.start_date, end_date, trading_days(self.start_date, end_date), incremental=True)
+            keys = self.database_manager.join_tables(keys=True)
+            span.add(len(keys))  # (ticker, date) keys updated
+            if self.cache.df is None:
+                self.cache.load()
+            elif keys:
+                self.cache.apply(keys)
+        self.last_update = datetime.now(MARKET_TIMEZONE)
+        return len(keys)
+
+
+    def schedule(self):
+        """
+        Runs update() after every NYSE close (+ update_delay, for the day's aggregates to be published) or when woken.
+        """
+        while not self.stopped.is_set():
+            self.next_update = next_update(datetime.now(MARKET_TIMEZONE), self.update_delay)
+            self.logger.output(f"Next update at {self.next_update:%Y-%m-%d %H:%M %Z}.")
+            self.wake.wait(timeout=max(0.0, (self.next_update - datetime.now(MARKET_TIMEZONE)).total_seconds()))
+            if self.stopped.is_set():
+                break
+            self.wake.clear()
+            try:
+                self.update()
+            except Exception as e:
+                self.logger.output(f"Update failed: {e}", "error")
+
+
+    def health(self):
+        df = self.cache.df
+        loaded = df is not None and len(df) > 0
+        return {
+            "status": "ok" if loaded else "loading",
+            "rows": 0 if df is None else len(df),
+            "tickers": int(df['ticker'].nunique()) if loaded else 0,
+            "first_date": f"{df['date'].min():%Y-%m-%d}" if loaded else None,
+            "last_date": f"{df['date'].max():%Y-%m-%d}" if loaded else None,
+            "strategies": sorted(self.cache.portfolios),
+            "cached_responses": len(self.cache.responses),
+            "last_update": self.last_update.isoformat(timespec="seconds") if self.last_update else None,
+            "next_update": self.next_update.isoformat(timespec="seconds") if self.next_update else None,
+        }
+
+
+    def start(self, update_now=True):
+        """
+        Warms the cache (after a catch-up update with update_now=True) & starts the query server & scheduler threads.
+        """
+        if update_now:
+            self.update()
+        else:
+            self.cache.load()
+        threading.Thread(target=self.httpd.serve_forever, name="daemon-http", daemon=True).start()
+        threading.Thread(target=self.schedule, name="daemon-schedule", daemon=True).start()
+        self.logger.output(f"Serving queries on {self.url}.")
+        return self
+
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+    def wait(self):
+        """
+        Blocks until SIGINT or SIGTERM, then stops the daemon.
+        """
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopped.set())
+        try:
+            while not self.stopped.wait(timeout=1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+
+def main():
+
+    ### CONFIG
+    PROJECT_NAME = "Aurelius"
+    VERSION_NUMBER = "0.0.7"
+    START_DATE = "2025-09-22"  # Updates procure every trading day from here to today that is not stored yet
+    DATABASES = ['database.db']
+    TABLES = ['ohlcv_daily', 'market_caps_daily']
+    TICKERS = ['JPM', 'GS', 'WFC', 'MS', 'C', 'BAC']
+    REQUESTS_PER_MINUTE = 5
+    MARKET_CAP_METHOD = 'snapshots'
+    RESPONSE_CACHE = 'response_cache.db'
+    STRATEGIES = ["market_cap_weighted", "equal_weighted", "market_cap_weighted_monthly", "equal_weighted_monthly"]
+    HOST, PORT = "127.0.0.1", 8765  # Localhost only
+    UPDATE_DELAY = timedelta(minutes=30)  # After the 16:00 ET close
+
+    ### DAEMON
+    logger = Logger(f"{PROJECT_NAME}_daemon", VERSION_NUMBER)
+    database_manager = DatabaseManager(DATABASES, TABLES, TICKERS, logger, requests_per_minute=REQUESTS_PER_MINUTE,
+                                       response_cache=ResponseCache(RESPONSE_CACHE), market_cap_method=MARKET_CAP_METHOD)
+    database_manager.initialize_database()
+    daemon = Daemon(database_manager, logger, START_DATE, STRATEGIES, HOST, PORT, UPDATE_DELAY).start()
+    daemon.wait()
+    logger.output(f"{PROJECT_NAME} daemon stopped.")
+    logger.close()
+
+
+if __name__ == "__main__":
+    main()
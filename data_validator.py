@@ -0,0 +1,101 @@
+import sqlite3
+import time
+import pandas as pd
+from database_manager import OHLCV_TABLES, INTERNAL_TABLES
+from trading_calendar import trading_days
+
+CHECKS = ("duplicates", "missing_trading_days", "ohlc_sanity", "non_positive_volume", "market_cap_jumps")
+REPORT_COLUMNS = ["database", "table", "check", "ticker", "rows", "first_date", "last_date"]
+
+
+class DataValidator:
+    """
+    Data-quality checks run as set-based SQL aggregations inside SQLite, so tables are never loaded into pandas.
+    Every check returns one row per offending ticker: (ticker, rows, first_date, last_date).
+
+    - duplicates            (ticker, date) keys stored more than once ((ticker, datetime) for intraday tables)
+    - missing_trading_days  NYSE trading days between a ticker's first & last date without a row
+    - ohlc_sanity           rows where low > high or open/close fall outside [low, high]
+    - non_positive_volume   rows with volume <= 0
+    - market_cap_jumps      day-over-day market cap changes above `jump_threshold` (0.5 = ±50%)
+    """
+    def __init__(self, databases, logger, jump_threshold=0.5, intervals=None):
+        self.databases = databases
+        self.logger = logger
+        self.jump_threshold = jump_threshold
+        self.intervals = {**OHLCV_TABLES, **(intervals or {})}
+
+
+    def queries(self, connection, table, columns):
+        """
+        The SQL of every check that applies to a table, as {check: (query, params)}.
+        """
+        grouped = "SELECT ticker, COUNT(*), MIN(date), MAX(date) FROM {source} GROUP BY ticker ORDER BY ticker"
+        key = "datetime" if self.intervals.get(table, (1, "day"))[1] != "day" and "datetime" in columns else "date"
+        queries = {
+            "duplicates": (grouped.format(source=f"(SELECT ticker, {key}, MIN(date) AS date FROM {table} GROUP BY ticker, {key} HAVING COUNT(*) > 1)"), ()),
+        }
+
+        first, last = connection.execute(f"SELECT MIN(date), MAX(date) FROM {table}").fetchone()
+        if first is not None:
+            connection.execute("DROP TABLE IF EXISTS temp.calendar")
+            connection.execute("CREATE TEMP TABLE calendar (date TEXT PRIMARY KEY) WITHOUT ROWID")
+            connection.executemany("INSERT INTO temp.calendar (date) VALUES (?)", ((day,) for day in trading_days(str(first)[:10], str(last)[:10])))
+            # Each ticker's span joined to the calendar, probing the (ticker, date) index for every trading day
+            queries["missing_trading_days"] = (f'''
+                SELECT s.ticker, COUNT(*), MIN(c.date), MAX(c.date)
+                FROM (SELECT ticker, MIN(date) AS first, MAX(date) AS last FROM {table} GROUP BY ticker) AS s
+                CROSS JOIN temp.calendar AS c ON (c.date BETWEEN s.first AND s.last)
+                WHERE NOT EXISTS (SELECT 1 FROM {table} AS t WHERE t.ticker = s.ticker AND t.date = c.date)
+                GROUP BY s.ticker ORDER BY s.ticker
+            ''', ())
+
+        if {"open", "high", "low", "close"}.issubset(columns):
+            queries["ohlc_sanity"] = (grouped.format(source=f"(SELECT ticker, date FROM {table} WHERE low > high OR low > MIN(open, close) OR high < MAX(open, close))"), ())
+        if "volume" in columns:
+            queries["non_positive_volume"] = (grouped.format(source=f"(SELECT ticker, date FROM {table} WHERE volume <= 0)"), ())
+        if "market_cap" in columns:
+            queries["market_cap_jumps"] = (grouped.format(source=f'''(
+                SELECT ticker, date FROM (
+                    SELECT ticker, date, market_cap, LAG(market_cap) OVER (PARTITION BY ticker ORDER BY date) AS previous FROM {table}
+                ) WHERE previous > 0 AND ABS(market_cap * 1.0 / previous - 1) > ?
+            )'''), (self.jump_threshold,))
+        return queries
+
+
+    def validate(self, tables=None, checks=CHECKS):
+        """
+        Runs the checks on every (or the given) table of every database. Returns a compact report DataFrame
+        (database, table, check, ticker, rows, first_date, last_date) with one row per offending ticker.
+        """
+        rows = []
+        for database in self.databases:
+            connection = sqlite3.connect(database)
+            table_names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                           if row[0] not in INTERNAL_TABLES and not row[0].startswith("sqlite_")]
+
+            for table in table_names:
+                if tables is not None and table not in tables:
+                    continue
+                columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                if not {"ticker", "date"}.issubset(columns):
+                    self.logger.output(f"Skipping validation of {table} ({database}) — missing 'ticker' or 'date' columns.")
+                    continue
+                connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ticker_date ON {table} (ticker, date)")
+
+                for check, (query, params) in self.queries(connection, table, columns).items():
+                    if check not in checks:
+                        continue
+                    start = time.perf_counter()
+                    results = connection.execute(query, params).fetchall()
+                    rows += [(database, table, check, *result) for result in results]
+                    issues = sum(result[1] for result in results)
+                    self.logger.output(f"{check} in {table} ({database}): "
+                                       + (f"{issues} rows across {len(results)} tickers" if results else "OK")
+                                       + f" ({time.perf_counter() - start:.2f}s).", "warning" if results else "info")
+            connection.commit()
+            connection.close()
+
+        report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+        self.logger.output(f"Validation finished: {len(report)} (table, check, ticker) issues.")
+        return report
@@ -1,35 +1,92 @@
 import sqlite3
-import requests
-import time
+import zlib
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from config import API_KEY
+from functools import partial
+import numpy as np
 import pandas as pd
+from polygon_client import PolygonClient, POLYGON_BASE_URL
+from trading_calendar import trading_days, contiguous_runs, to_date
+
+try:
+    from config import API_KEY
+except ImportError:
+    API_KEY = None  # config.py is optional when running against a local stand-in server or replaying cached responses
+
+OHLCV_COLUMNS = ("timestamp", "datetime", "date", "ticker", "open", "high", "low", "close", "volume",
+                 "volume_weighted", "trades", "resultsCount", "request_id", "etl_datetime")
+OHLCV_TABLES = {"ohlcv_daily": (1, "day"), "ohlcv_hourly": (1, "hour"), "ohlcv_minute": (1, "minute")}  # table: (multiplier, timespan)
+BARS_PER_TRADING_DAY = {"minute": 960, "hour": 16, "day": 1}  # Base aggregates per day incl. extended hours (04:00-20:00 ET)
+INTERNAL_TABLES = {"procurement_coverage", "refresh_state"}  # Bookkeeping tables not returned by get_database_tables()
+RESULT_LIMIT = 50000  # Polygon's maximum number of base aggregates per aggregates response
+MARKET_CAP_COLUMNS = ("date", "ticker", "share_class_shares_outstanding", "weighted_shares_outstanding",
+                      "market_cap", "request_id", "etl_datetime")
 
 class DatabaseManager:
-    def __init__(self, databases, tables, tickers, logger):
+    def __init__(self, databases, tables, tickers, logger, requests_per_minute=5, max_workers=None, base_url=POLYGON_BASE_URL,
+                 batch_size=1000, cache_size_kib=65536, response_cache=None, market_cap_method="daily", intervals=None,
+                 sharded=None, name="database"):
+        """
+        With several databases, tickers are sharded across them by a stable hash of the ticker (see shard_for)
+        unless sharded=False, in which case every database receives every ticker. Tables merged across shards
+        are keyed '<name>_<table>' by get_database_tables().
+        """
         self.databases = databases
+        self.sharded = len(databases) > 1 if sharded is None else sharded
+        self.name = name
         self.tables = tables
         self.tickers = tickers
         self.logger = logger
+        self.batch_size = batch_size
+        self.cache_size_kib = cache_size_kib
+        self.market_cap_method = market_cap_method  # "daily" (one request per ticker per day) or "snapshots"
+        self.intervals = {**OHLCV_TABLES, **(intervals or {})}  # e.g. {"ohlcv_minute": (5, "minute")}
+        self.client = PolygonClient(API_KEY, logger, requests_per_minute=requests_per_minute, max_workers=max_workers, base_url=base_url,
+                                    cache=response_cache, callers=len(databases))
 
 
-    def get_data(self, url):
-        """ 
-        Helper method that facilitates executing GET requests. 
+    def shard_for(self, ticker):
         """
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            self.logger.output(f"Failed to get data from {url}: {e}", "error")
-            raise
+        The database a ticker is stored in. CRC32 of the ticker is stable across runs, processes & machines
+        (unlike hash()), so a ticker always lands in the same shard for a given list of databases.
+        """
+        return self.databases[zlib.crc32(ticker.encode()) % len(self.databases)]
+
+
+    def tickers_by_database(self, tickers=None):
+        """
+        {database: [tickers]} - each ticker in its shard, or every ticker in every database when not sharded.
+        """
+        tickers = self.tickers if tickers is None else tickers
+        if not self.sharded:
+            return {database: list(tickers) for database in self.databases}
+        shards = {database: [] for database in self.databases}
+        for ticker in tickers:
+            shards[self.shard_for(ticker)].append(ticker)
+        return shards
+
+
+    def fan_out(self, function, databases):
+        """
+        Runs function(database) for every database on its own thread (SQLite releases the GIL while it works &
+        every shard has its own file & write lock). Returns {database: result}; the first exception is re-raised.
+        """
+        databases = list(databases)
+        if len(databases) <= 1:
+            return {database: function(database) for database in databases}
+        with ThreadPoolExecutor(max_workers=len(databases), thread_name_prefix="shard") as executor:
+            return dict(zip(databases, executor.map(function, databases)))
 
 
-    def get_unique_dates(self, start_date, end_date):
+    def get_unique_dates(self, start_date, end_date, trading_days_only=True):
         """ 
         Gets list of all dates in YYYY-MM-DD format between the global variables START_DATE & END_DATE. 
+        By default only NYSE trading days are returned (see trading_calendar.py).
         """
+        if trading_days_only:
+            return trading_days(start_date, end_date)
+
         start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
         end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
         delta = (end_date - start_date).days
@@ -80,27 +137,41 @@ class DatabaseManager:
             UNIQUE (date, ticker,  share_class_shares_outstanding, weighted_shares_outstanding, market_cap)
         '''
 
+        ### PROCUREMENT COVERAGE TABLE (date ranges already requested per table x ticker)
+        coverage_schema = '''
+            table_name TEXT,
+            ticker TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            etl_datetime TEXT,
+            PRIMARY KEY (table_name, ticker, start_date)
+        '''
+
         for database in self.databases:
             # Create SQL connection & cursor object
-            connection = sqlite3.connect(database)
+            connection = self.connect(database)
             cursor = connection.cursor()
 
             #####################
             ### SQL EXECUTION ### 
             #####################
 
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS procurement_coverage ({coverage_schema})")
+
             for table in self.tables:
 
-                ### OHLCV DAILY TABLE
-                if table == "ohlcv_daily":
+                ### OHLCV TABLES (daily, hourly & minute bars share one schema)
+                if table in OHLCV_TABLES:
                     self.logger.output(f"Initializing table {table} in {database}...")
                     cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({ohlcv_daily_schema})")
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ticker_date ON {table} (ticker, date)")
                     self.logger.output(f"Table {table} in {database} is initialized.")
 
                 ### MARKET CAPS DAILY TABLE
                 elif table == "market_caps_daily":
                     self.logger.output(f"Initializing table {table} in {database}...")
                     cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({market_caps_daily_schema})")
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ticker_date ON {table} (ticker, date)")
                     self.logger.output(f"Table {table} in {database} is initialized.")
                 
                 ### ERROR HANDLING
@@ -113,138 +184,463 @@ class DatabaseManager:
             connection.close()
 
 
-    def procure_data(self, start_date, end_date, unique_dates):
+    def connect(self, database):
+        """
+        Opens a SQLite connection tuned for bulk loading: WAL journal, NORMAL sync & a larger page cache.
+        """
+        connection = sqlite3.connect(database)
+        connection.execute("PRAGMA journal_mode=WAL;")
+        connection.execute("PRAGMA synchronous=NORMAL;")
+        connection.execute(f"PRAGMA cache_size=-{self.cache_size_kib};")
+        connection.execute("PRAGMA temp_store=MEMORY;")
+        return connection
+
+
+    def write_rows(self, connection, table, columns, rows):
+        """
+        Inserts a batch of row tuples with executemany inside a single transaction. Returns the number of new rows.
+        """
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" for _ in columns)
+        with connection:
+            before = connection.total_changes
+            connection.executemany(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+            )
+            return connection.total_changes - before
+
+
+    def ohlcv_rows(self, data, etl_datetime):
+        """
+        Converts one OHLCV aggregates response into a list of row tuples (in OHLCV_COLUMNS order).
+        """
+        rows = []
+        for result in data.get('results') or []:
+            try:
+                dt = datetime.fromtimestamp(result['t'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                rows.append((
+                    result['t'],
+                    dt,
+                    dt[:10],
+                    data['ticker'],
+                    result['o'],
+                    result['h'],
+                    result['l'],
+                    result['c'],
+                    result['v'],
+                    result['vw'],
+                    result['n'],
+                    data['resultsCount'],
+                    data['request_id'],
+                    etl_datetime
+                ))
+            except ValueError as ve:
+                self.logger.output(f"Error: {ve}")  # Handle malformed values gracefully
+            except KeyError as ke:
+                self.logger.output(f"Missing key in data: {ke}")  # Handle missing keys in the data
+        return rows
+
+
+    def market_cap_row(self, date, data, etl_datetime):
+        """
+        Converts one ticker reference response into a row tuple (in MARKET_CAP_COLUMNS order), or None.
+        """
+        try:
+            return (
+                date,
+                data['results']['ticker'],
+                data['results']['share_class_shares_outstanding'],
+                data['results']['weighted_shares_outstanding'],
+                data['results']['market_cap'],
+                data['request_id'],
+                etl_datetime
+            )
+        except KeyError as ke:
+            self.logger.output(f"Missing key in data: {ke}")  # Handle missing keys in the data
+            return None
+
+
+    def get_coverage(self, connection, table, ticker):
+        """
+        Returns the sorted (start_date, end_date) ranges already procured for a table x ticker.
+        """
+        return connection.execute(
+            "SELECT start_date, end_date FROM procurement_coverage WHERE table_name = ? AND ticker = ? ORDER BY start_date",
+            (table, ticker)
+        ).fetchall()
+
+
+    def get_missing_dates(self, connection, table, ticker, dates):
+        """
+        Filters `dates` (YYYY-MM-DD) down to those not covered by a previous procurement of table x ticker.
+        """
+        coverage = self.get_coverage(connection, table, ticker)
+        return [date for date in dates if not any(start <= date <= end for start, end in coverage)]
+
+
+    def record_coverage(self, connection, table, ticker, ranges):
+        """
+        Marks (start_date, end_date) ranges as procured for table x ticker, merging ranges that touch
+        (no trading day in between). Dates from today onwards are not recorded, as they may still change.
+        """
+        last_final_date = (datetime.now(timezone.utc).date() - timedelta(days=1)).strftime("%Y-%m-%d")
+        ranges = [(start, min(end, last_final_date)) for start, end in ranges if start <= last_final_date]
+        if not ranges:
+            return
+
+        merged = []
+        for start, end in sorted(self.get_coverage(connection, table, ticker) + ranges):
+            if merged and (start <= merged[-1][1] or not trading_days(to_date(merged[-1][1]) + timedelta(days=1), to_date(start) - timedelta(days=1))):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+
+        etl_datetime = str(datetime.now())
+        with connection:
+            connection.execute("DELETE FROM procurement_coverage WHERE table_name = ? AND ticker = ?", (table, ticker))
+            connection.executemany(
+                "INSERT INTO procurement_coverage (table_name, ticker, start_date, end_date, etl_datetime) VALUES (?, ?, ?, ?, ?)",
+                [(table, ticker, start, end, etl_datetime) for start, end in merged]
+            )
+
+
+    def get_closes(self, connection, dates_by_ticker):
+        """
+        Returns the stored ohlcv_daily closes (ticker, date, close) for the requested dates of each ticker.
+        """
+        frames = []
+        for ticker, dates in dates_by_ticker.items():
+            if not dates:
+                continue
+            closes = pd.read_sql(
+                "SELECT ticker, date, close FROM ohlcv_daily WHERE ticker = ? AND date >= ? AND date <= ?",
+                connection, params=(ticker, min(dates), max(dates))
+            )
+            frames.append(closes[closes['date'].isin(dates)])
+        if not frames:
+            return pd.DataFrame(columns=['ticker', 'date', 'close'])
+        return pd.concat(frames, ignore_index=True).drop_duplicates(['ticker', 'date'], keep='last')
+
+
+    def get_share_snapshots(self, dates_by_ticker):
+        """
+        Finds every shares outstanding change in each ticker's sorted dates with as few reference requests as possible.
+        Both ends of the range are requested first; any interval whose ends disagree is bisected (all tickers
+        concurrently, level by level) until each change is pinned to the first day it applies.
+        Returns ({ticker: {date: (share_class_shares_outstanding, weighted_shares_outstanding, request_id)}}, failed tickers).
+        Note that a change that reverts between two equal snapshots is not detected.
+        """
+        base_url = self.client.base_url
+        snapshots = {ticker: {} for ticker in dates_by_ticker}
+        failed = set()
+
+        def probe(ticker_dates):
+            jobs = (((ticker, date), f"{base_url}/v3/reference/tickers/{ticker}?date={date}") for ticker, date in ticker_dates)
+            for (ticker, date), data in self.client.fetch_many(jobs):
+                if data is None:
+                    failed.add(ticker)
+                    continue
+                results = data.get('results') or {}
+                snapshots[ticker][date] = (
+                    results.get('share_class_shares_outstanding'),
+                    results.get('weighted_shares_outstanding'),
+                    data.get('request_id')
+                )
+
+        probe(
+            [(ticker, dates[0]) for ticker, dates in dates_by_ticker.items() if dates]
+            + [(ticker, dates[-1]) for ticker, dates in dates_by_ticker.items() if len(dates) > 1]
+        )
+
+        frontier = [(ticker, 0, len(dates) - 1) for ticker, dates in dates_by_ticker.items() if len(dates) > 2]
+        while frontier:
+            probes, next_frontier = [], []
+            for ticker, lo, hi in frontier:
+                dates = dates_by_ticker[ticker]
+                if ticker in failed or hi - lo < 2 or snapshots[ticker][dates[lo]][:2] == snapshots[ticker][dates[hi]][:2]:
+                    continue
+                mid = (lo + hi) // 2
+                probes.append((ticker, dates[mid]))
+                next_frontier += [(ticker, lo, mid), (ticker, mid, hi)]
+            probe(probes)
+            frontier = next_frontier
+
+        return {ticker: snapshot for ticker, snapshot in snapshots.items() if ticker not in failed}, failed
+
+
+    def procure_market_caps(self, connection, table, database, dates_by_ticker):
+        """
+        Derives daily market caps from sparse shares outstanding snapshots & the stored ohlcv_daily closes.
+        Request volume scales with the number of share count changes instead of the number of days.
+        market_cap = close x weighted_shares_outstanding (share_class_shares_outstanding if not reported).
+        """
+        closes = self.get_closes(connection, dates_by_ticker)
+        if closes.empty:
+            self.logger.output(f"No stored ohlcv_daily closes to derive market caps from for {table} ({database}).")
+            return
+
+        dates_by_ticker = {ticker: sorted(group['date']) for ticker, group in closes.groupby('ticker')}
+        snapshots, failed = self.get_share_snapshots(dates_by_ticker)
+        for ticker in failed:
+            self.logger.output(f"*** Share snapshots incomplete! ***   {ticker} skipped in {table} ({database}).", "warning")
+        for ticker, snapshot in snapshots.items():
+            self.logger.output(f"Market cap data for {ticker}: {len(snapshot)} snapshot requests for {len(dates_by_ticker[ticker])} days.")
+
+        snapshots = pd.DataFrame(
+            [(ticker, date, *values) for ticker, snapshot in snapshots.items() for date, values in snapshot.items()],
+            columns=['ticker', 'date', 'share_class_shares_outstanding', 'weighted_shares_outstanding', 'request_id']
+        )
+        if snapshots.empty:
+            return
+
+        # As-of join: every day takes the latest snapshot on or before it
+        closes = closes[closes['ticker'].isin(snapshots['ticker'])].copy()
+        closes['as_of'] = pd.to_datetime(closes['date'])
+        snapshots['as_of'] = pd.to_datetime(snapshots['date'])
+        market_caps = pd.merge_asof(
+            closes.sort_values('as_of'), snapshots.drop(columns='date').sort_values('as_of'),
+            on='as_of', by='ticker', direction='backward'
+        )
+        shares = market_caps['weighted_shares_outstanding'].fillna(market_caps['share_class_shares_outstanding'])
+        market_caps['market_cap'] = market_caps['close'] * shares
+        market_caps['etl_datetime'] = str(datetime.now())
+
+        # Days without reported shares (e.g. before listing) have no market cap & are not stored
+        stored_rows = market_caps.dropna(subset=['market_cap'])
+        rows = list(stored_rows[list(MARKET_CAP_COLUMNS)].astype(object).itertuples(index=False, name=None))
+        stored = 0
+        for i in range(0, len(rows), 100 * self.batch_size):
+            stored += self.write_rows(connection, table, MARKET_CAP_COLUMNS, rows[i:i + 100 * self.batch_size])
+        self.logger.output(f"Market cap data stored in {table} ({database}): {stored} new of {len(rows)} rows.")
+
+        for ticker, group in market_caps.groupby('ticker'):
+            self.record_coverage(connection, table, ticker, [(date, date) for date in group['date']])
+
+
+    def get_windows(self, start_date, end_date, timespan):
+        """
+        Splits a date range into (start, end) windows of whole trading days small enough for one response.
+        """
+        days = trading_days(start_date, end_date)
+        window_days = max(1, RESULT_LIMIT // BARS_PER_TRADING_DAY.get(timespan, 1))
+        return [(days[i], days[min(i + window_days, len(days)) - 1]) for i in range(0, len(days), window_days)]
+
+
+    def download_ohlcv_range(self, connection, table, database, ranges_by_ticker, multiplier=1, timespan="day"):
+        """
+        Downloads OHLCV bars for {ticker: [(start_date, end_date), ...]} at any `multiplier` x `timespan`
+        (minute, hour or day). Ranges are split into windows sized to the result cap, windows are fetched
+        concurrently within the rate budget & next_url pages are followed. Each page is written to the
+        database as it arrives, so memory use does not grow with the length of the history.
+        A window is recorded as covered once its last page is stored.
+        """
+        base_url = self.client.base_url
+        jobs = []
+        for ticker, ranges in ranges_by_ticker.items():
+            for range_start, range_end in ranges:
+                for window_start, window_end in self.get_windows(range_start, range_end, timespan):
+                    self.logger.output(f"Requesting OHLCV data for {ticker} {window_start} to {window_end} in {table} ({database})...", "debug") # Log API request
+                    url = (f"{base_url}/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{window_start}/{window_end}"
+                           f"?sort=asc&limit={RESULT_LIMIT}")
+                    jobs.append(((ticker, window_start, window_end), url))
+
+        for (ticker, window_start, window_end), data in self.client.fetch_many(jobs, follow_next_url=True):
+            if data is None:
+                continue
+            rows = self.ohlcv_rows(data, str(datetime.now()))
+            stored = self.write_rows(connection, table, OHLCV_COLUMNS, rows)
+            self.logger.output(f"OHLCV data stored for {ticker} {window_start} to {window_end} in {table} ({database}): {stored} new of {len(rows)} rows.")
+            if not data.get('next_url'):
+                self.record_coverage(connection, table, ticker, [(window_start, window_end)])
+
+
+    def procure_data(self, start_date, end_date, unique_dates, incremental=False):
         """
         Performs GET requests to get data from polygon.io.
+        Requests are fetched concurrently within the client's rate limit; rows are written on this thread
+        in one transaction per OHLCV response & per `batch_size` market cap responses.
+        With incremental=True only trading days not yet covered per table x ticker are requested.
+        Each database (shard) is procured by its own worker, all drawing from the client's shared rate limit.
         """
-        for database in self.databases:
-            connection = sqlite3.connect(database)
-            for table in self.tables:
+        shards = self.tickers_by_database()
+        self.fan_out(lambda database: self.procure_database(database, shards[database], start_date, end_date, unique_dates, incremental),
+                     [database for database, tickers in shards.items() if tickers])
 
-                ### OHLCV DAILY TABLE ###
-                if table == "ohlcv_daily":
-                    for ticker in self.tickers:
-
-                        # GET request...
-                        self.logger.output(f"Requesting OHLCV data for {ticker} in {table} ({database})...") # Log API request
-                        time.sleep(12.5)  # Avoid API rate limits
-                        interval = "1/day"
-                        url = f"https://api.polygon.io/v2/aggs/ticker/{ticker}/range/{interval}/{start_date}/{end_date}?apiKey={API_KEY}"
-                        data = self.get_data(url)
-
-                        # Data processing...
-                        if data['results']:
-                            for result in data['results']:
-                                try:
-                                    dt = datetime.fromtimestamp(result['t'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-                                    date = datetime.fromtimestamp(result['t'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
-                                    cursor = connection.cursor()
-                                    etl_datetime = datetime.now()
-                                    cursor.execute(f'''
-                                        INSERT OR IGNORE INTO {table} (timestamp, datetime, date, ticker, open, high, low, close, volume, volume_weighted, trades, resultsCount, request_id, etl_datetime)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                    ''', (
-                                        result['t'],
-                                        dt,
-                                        date,
-                                        data['ticker'],
-                                        result['o'],
-                                        result['h'],
-                                        result['l'],
-                                        result['c'],
-                                        result['v'],
-                                        result['vw'],
-                                        result['n'],
-                                        data['resultsCount'],
-                                        data['request_id'],
-                                        etl_datetime
-                                    ))
-                                    connection.commit()
-                                    self.logger.output(f"OHLCV data stored for {date} | {ticker} in {table} ({database}).")
-                                
-                                except ValueError as ve:
-                                    self.logger.output(f"Error: {ve}")  # Handle empty results gracefully
-                                except KeyError as ke:
-                                    self.logger.output(f"Missing key in data: {ke}")  # Handle missing keys in the data
-                                except Exception as e:
-                                    self.logger.output(f"An unexpected error occurred: {e}")  # Catch other unforeseen errors
-                                    
-
-                        # self.aggregate_bars(connection, data, table)
-                        # self.logger.output(f"Data stored for {ticker} in {table} ({database}).")
-
-                ### MARKET CAPS DAILY TABLE ###
-                elif table == "market_caps_daily":
-                    for ticker in self.tickers:
-                        for date in unique_dates:
-
-                            # GET request...
-                            self.logger.output(f"Requesting market cap data for {date} | {ticker} in {table} ({database})...") # Log API request
-                            time.sleep(12.5)  # Avoid API rate limits
-                            url = f"https://api.polygon.io/v3/reference/tickers/{ticker}?date={date}&apiKey={API_KEY}"
-                            data = self.get_data(url)
-
-                            # Data processing...
-                            if data['results']:
-                                try:
-                                    cursor = connection.cursor()
-                                    etl_datetime = datetime.now()
-                                    cursor.execute(f'''
-                                        INSERT OR IGNORE INTO {table} (date, ticker, share_class_shares_outstanding, weighted_shares_outstanding, market_cap, request_id, etl_datetime)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                                        ''', (
-                                            date,
-                                            data['results']['ticker'],
-                                            data['results']['share_class_shares_outstanding'],
-                                            data['results']['weighted_shares_outstanding'],
-                                            data['results']['market_cap'],
-                                            data['request_id'],
-                                            etl_datetime
-                                        ))
-                                    connection.commit()
-                                    self.logger.output(f"Market cap data stored for {date} | {ticker} in {table} ({database}).")
-
-                                except ValueError as ve:
-                                    self.logger.output(f"Error: {ve}")  # Handle empty results gracefully
-                                except KeyError as ke:
-                                    self.logger.output(f"Missing key in data: {ke}")  # Handle missing keys in the data
-                                except Exception as e:
-                                    self.logger.output(f"An unexpected error occurred: {e}")  # Catch other unforeseen errors
-                            else:
-                                self.logger.output(f"*** No market cap data! ***   {date} | {ticker} in {table} ({database}).") # Handle missing data
-                
-                ### ERROR HANDLING
-                else:
-                    self.logger.output(f"Unknown table {table} encountered in procure_data() method...") # Handles incorrect table names
 
-            # Close database SQL connection 
-            cursor.close()
-            connection.close()
+    def procure_database(self, database, tickers, start_date, end_date, unique_dates, incremental=False):
+        """
+        procure_data for one database & its tickers.
+        """
+        base_url = self.client.base_url
+        connection = self.connect(database)
+        for table in self.tables:
+
+            ### OHLCV TABLES ###
+            if table in OHLCV_TABLES:
+                multiplier, timespan = self.intervals[table]
+                ranges_by_ticker = {}
+                for ticker in tickers:
+                    dates = trading_days(start_date, end_date)
+                    if incremental:
+                        dates = self.get_missing_dates(connection, table, ticker, dates)
+                    ranges_by_ticker[ticker] = contiguous_runs(dates)
+                self.download_ohlcv_range(connection, table, database, ranges_by_ticker, multiplier, timespan)
+
+            ### MARKET CAPS DAILY TABLE (derived from share count snapshots & stored closes) ###
+            elif table == "market_caps_daily" and self.market_cap_method == "snapshots":
+                dates_by_ticker = {
+                    ticker: self.get_missing_dates(connection, table, ticker, unique_dates) if incremental else list(unique_dates)
+                    for ticker in tickers
+                }
+                self.procure_market_caps(connection, table, database, dates_by_ticker)
+
+            ### MARKET CAPS DAILY TABLE (one reference request per ticker per day) ###
+            elif table == "market_caps_daily":
+                def jobs():
+                    for ticker in tickers:
+                        dates = self.get_missing_dates(connection, table, ticker, unique_dates) if incremental else unique_dates
+                        for date in dates:
+                            self.logger.output(f"Requesting market cap data for {date} | {ticker} in {table} ({database})...", "debug") # Log API request
+                            yield (ticker, date), f"{base_url}/v3/reference/tickers/{ticker}?date={date}"
+
+                rows = []
+                covered = {}
+                for (ticker, date), data in self.client.fetch_many(jobs()):
+                    if data is None:
+                        continue
+                    covered.setdefault(ticker, []).append((date, date))
+                    if not data.get('results'):
+                        self.logger.output(f"*** No market cap data! ***   {date} | {ticker} in {table} ({database}).") # Handle missing data
+                        continue
+                    row = self.market_cap_row(date, data, str(datetime.now()))
+                    if row is not None:
+                        rows.append(row)
+                    if len(rows) >= self.batch_size:
+                        stored = self.write_rows(connection, table, MARKET_CAP_COLUMNS, rows)
+                        self.logger.output(f"Market cap data stored in {table} ({database}): {stored} new of {len(rows)} rows.")
+                        rows = []
+
+                stored = self.write_rows(connection, table, MARKET_CAP_COLUMNS, rows)
+                self.logger.output(f"Market cap data stored in {table} ({database}): {stored} new of {len(rows)} rows.")
+                for ticker, ranges in covered.items():
+                    self.record_coverage(connection, table, ticker, ranges)
+
+            ### ERROR HANDLING
+            else:
+                self.logger.output(f"Unknown table {table} encountered in procure_data() method...") # Handles incorrect table names
+
+        # Close database SQL connection 
+        connection.close()
+
+
+    def join_tables(self, keys=False):
+        """
+        Maintains ohlcv_market_caps_daily (ohlcv_daily rows joined with market_cap) incrementally.
+        Source rows inserted since the last refresh are found through per-table id watermarks & only their
+        (ticker, date) keys are deleted & re-joined, so a refresh costs O(new rows) instead of O(history).
+        The first refresh (or one after the watermarks were lost) rebuilds the joined table from scratch.
+        Shards are refreshed in parallel. Returns the number of (ticker, date) keys updated across databases,
+        or with keys=True the updated (ticker, date) keys themselves (e.g. to invalidate cached results).
+        """
+        updated = self.fan_out(partial(self.join_database, keys=keys), self.databases)
+        return [key for database_keys in updated.values() for key in database_keys] if keys else sum(updated.values())
 
 
-    def join_tables(self):
-        for database in self.databases:
-            connection = sqlite3.connect(database)
-            cursor = connection.cursor()
-            cursor.execute("DROP TABLE IF EXISTS ohlcv_market_caps_daily;")
+    def join_database(self, database, keys=False):
+        """
+        join_tables for one database. Returns the number of (ticker, date) keys updated (or the keys with keys=True).
+        """
+        connection = self.connect(database)
+        cursor = connection.cursor()
+        tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+        if not {"ohlcv_daily", "market_caps_daily"}.issubset(tables):
+            self.logger.output(f"Skipping join in {database} — ohlcv_daily & market_caps_daily are both required.")
+            connection.close()
+            return [] if keys else 0
+
+        with connection:
+            cursor.execute("CREATE TABLE IF NOT EXISTS refresh_state (name TEXT PRIMARY KEY, value INTEGER)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ohlcv_daily_ticker_date ON ohlcv_daily (ticker, date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_market_caps_daily_ticker_date ON market_caps_daily (ticker, date)")
+            state = dict(cursor.execute("SELECT name, value FROM refresh_state WHERE name LIKE 'ohlcv_market_caps_daily.%'"))
+
+            # (Re)build an empty joined table if it has never been maintained incrementally
+            if "ohlcv_market_caps_daily" not in tables or not state:
+                self.logger.output(f"Rebuilding ohlcv_market_caps_daily in {database}...")
+                cursor.execute("DROP TABLE IF EXISTS ohlcv_market_caps_daily;")
+                cursor.execute("""
+                    CREATE TABLE ohlcv_market_caps_daily AS
+                        SELECT o.*, m.market_cap
+                        FROM ohlcv_daily AS o
+                        JOIN market_caps_daily AS m ON (o.ticker = m.ticker AND o.date = m.date)
+                        WHERE 0;
+                    """)
+                cursor.execute("CREATE INDEX idx_ohlcv_market_caps_daily_ticker_date ON ohlcv_market_caps_daily (ticker, date)")
+                state = {}
+            # Date-ordered scans for streamed backtests (stream_table)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ohlcv_market_caps_daily_date ON ohlcv_market_caps_daily (date)")
+
+            ohlcv_watermark = state.get("ohlcv_market_caps_daily.ohlcv_daily", 0)
+            market_caps_watermark = state.get("ohlcv_market_caps_daily.market_caps_daily", 0)
+            ohlcv_max_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ohlcv_daily").fetchone()[0]
+            market_caps_max_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM market_caps_daily").fetchone()[0]
+
+            # Keys touched since the last refresh
+            cursor.execute("DROP TABLE IF EXISTS temp.touched_keys")
+            # TEXT key columns keep both (ticker, date) indexes usable (ohlcv_daily.date has NUMERIC affinity)
+            cursor.execute("CREATE TEMP TABLE touched_keys (ticker TEXT, date TEXT)")
             cursor.execute("""
-                CREATE TABLE ohlcv_market_caps_daily AS
+                INSERT INTO temp.touched_keys
+                    SELECT ticker, date FROM ohlcv_daily WHERE id > ? AND id <= ?
+                    UNION
+                    SELECT ticker, date FROM market_caps_daily WHERE id > ? AND id <= ?;
+                """, (ohlcv_watermark, ohlcv_max_id, market_caps_watermark, market_caps_max_id))
+            touched = cursor.execute("SELECT COUNT(*) FROM temp.touched_keys").fetchone()[0]
+
+            cursor.execute("""
+                DELETE FROM ohlcv_market_caps_daily
+                WHERE (ticker, date) IN (SELECT ticker, date FROM temp.touched_keys);
+                """)
+            # CROSS JOIN pins the join order: drive from the (small) touched keys into both indexes
+            cursor.execute("""
+                INSERT INTO ohlcv_market_caps_daily
                     SELECT o.*, m.market_cap
-                    FROM ohlcv_daily AS o
-                    JOIN market_caps_daily AS m ON (o.ticker = m.ticker AND o.date = m.date);
+                    FROM temp.touched_keys AS k
+                    CROSS JOIN ohlcv_daily AS o ON (o.ticker = k.ticker AND o.date = k.date)
+                    CROSS JOIN market_caps_daily AS m ON (m.ticker = k.ticker AND m.date = k.date);
                 """)
-            connection.commit()
-            cursor.close()
-            connection.close()
+            cursor.executemany("INSERT OR REPLACE INTO refresh_state (name, value) VALUES (?, ?)", [
+                ("ohlcv_market_caps_daily.ohlcv_daily", ohlcv_max_id),
+                ("ohlcv_market_caps_daily.market_caps_daily", market_caps_max_id),
+            ])
+            updated = cursor.execute("SELECT ticker, date FROM temp.touched_keys").fetchall() if keys else touched
+            cursor.execute("DROP TABLE temp.touched_keys")
 
-        return 0
+        self.logger.output(f"ohlcv_market_caps_daily in {database} refreshed: {touched} (ticker, date) keys updated.")
+        cursor.close()
+        connection.close()
+        return updated
 
 
-    def get_database_tables(self):
+    def get_database_tables(self, tables=None, columns=None, tickers=None, start_date=None, end_date=None,
+                            chunksize=100000, float32=False, snapshot_cache=None):
         """
-        Returns a dictionary of all SQLite database tables as Pandas DataFrames. Automatically detects all table names in each database.
+        Returns a lazy dictionary of SQLite database tables as Pandas DataFrames, keyed '<database>_<table>'.
+        Automatically detects all table names in each database (bookkeeping tables are left out).
+        A table is only read when it is first accessed. Filters are pushed into SQL:
+            tables      - table names to expose (default: all)
+            columns     - list of columns for every table, or {table: [columns]}
+            tickers     - only rows for these tickers
+            start_date  - only rows with date >= start_date (YYYY-MM-DD)
+            end_date    - only rows with date <= end_date (YYYY-MM-DD)
+        Rows are read in chunks of `chunksize` with compact dtypes: categorical ticker, datetime64 date/datetime
+        & optionally float32 floats.
+        With a SnapshotCache, its tables are served from memory-mapped snapshots while the source data is unchanged.
+        When sharded, each table is read from all shards in parallel & merged under the key '<name>_<table>'.
         """
-        database_tables = {}
+        database_tables = LazyTables()
+        tables_by_database = {}
 
         for database in self.databases:
             conn = sqlite3.connect(database)
@@ -252,18 +648,247 @@ class DatabaseManager:
 
             # Get all table names from sqlite_master
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            table_names = [row[0] for row in cursor.fetchall()]
-
-            # Load each table into a DataFrame
-            for table in table_names:
-                key_name = f"{database.split('.')[0]}_{table}"
-                query = f"SELECT * FROM {table}"
-                database_tables[key_name] = pd.read_sql(query, conn)
+            tables_by_database[database] = [row[0] for row in cursor.fetchall() if row[0] not in INTERNAL_TABLES and not row[0].startswith("sqlite_")]
 
             cursor.close()
             conn.close()
 
+        # Register a loader for each table - one per database, or one per table merging every shard
+        if self.sharded:
+            table_names = sorted({table for names in tables_by_database.values() for table in names})
+            sources = [(self.name, table, [database for database in self.databases if table in tables_by_database[database]])
+                       for table in table_names]
+        else:
+            sources = [(database.split('.')[0], table, [database]) for database in self.databases for table in tables_by_database[database]]
+
+        for key_prefix, table, databases in sources:
+            if tables is not None and table not in tables:
+                continue
+            key_name = f"{key_prefix}_{table}"
+            table_columns = columns.get(table) if isinstance(columns, dict) else columns
+            loader = partial(self.load_shards, databases, table, table_columns, tickers, start_date, end_date, chunksize, float32)
+            if snapshot_cache is not None and table in snapshot_cache.tables:
+                load_args = [table_columns, tickers, start_date, end_date, float32]
+                loader = partial(snapshot_cache.load, databases if self.sharded else databases[0], table, loader, load_args,
+                                 self.name if self.sharded else None)
+            database_tables.register(key_name, loader)
+
         return database_tables
 
-    
 
+    def load_shards(self, databases, table, columns=None, tickers=None, start_date=None, end_date=None, chunksize=100000, float32=False):
+        """
+        Reads one table from every shard in parallel (see load_table) & concatenates the parts.
+        With a ticker filter only the shards holding those tickers are read.
+        """
+        databases = self.holding_shards(databases, tickers)
+        parts = self.fan_out(lambda database: self.load_table(database, table, columns, tickers, start_date, end_date, chunksize, float32), databases)
+        parts = [part for part in parts.values() if len(part)] or list(parts.values())[:1]
+        if len(parts) == 1:
+            return parts[0]
+        return self.concat_shards(parts, self.shard_ticker_dtype(parts))
+
+
+    def holding_shards(self, databases, tickers=None):
+        """
+        The shards among `databases` holding any of `tickers` (all of them without a ticker filter or when not sharded).
+        """
+        if not self.sharded or tickers is None:
+            return databases
+        holding = {self.shard_for(ticker) for ticker in tickers}
+        return [database for database in databases if database in holding] or databases[:1]
+
+
+    @staticmethod
+    def shard_ticker_dtype(parts):
+        """
+        One categorical dtype over the ticker categories of frames read from different shards (None without a ticker column).
+        """
+        if not parts or 'ticker' not in parts[0].columns:
+            return None
+        return pd.CategoricalDtype(sorted({ticker for part in parts for ticker in part['ticker'].cat.categories}))
+
+
+    @staticmethod
+    def concat_shards(parts, ticker_dtype):
+        """
+        Concatenates frames read from different shards under one ticker dtype, so the column stays categorical.
+        """
+        if ticker_dtype is not None:
+            parts = [part.assign(ticker=part['ticker'].astype(str).astype(ticker_dtype)) for part in parts]
+        return pd.concat(parts, ignore_index=True)
+
+
+    def table_query(self, conn, table, columns=None, tickers=None, start_date=None, end_date=None):
+        """
+        Builds the filtered SELECT for load_table & stream_table. Returns (columns, query, params, ticker dtype).
+        """
+        available = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        selected = [column for column in columns if column in available] if columns else available
+
+        where, params = [], []
+        if tickers is not None and 'ticker' in available:
+            where.append(f"ticker IN ({', '.join('?' for _ in tickers)})")
+            params += list(tickers)
+        if start_date is not None and 'date' in available:
+            where.append("date >= ?")
+            params.append(start_date)
+        if end_date is not None and 'date' in available:
+            where.append("date <= ?")
+            params.append(end_date)
+        query = f"SELECT {', '.join(selected)} FROM {table}" + (f" WHERE {' AND '.join(where)}" if where else "")
+
+        # Fixed categories so every chunk shares one categorical dtype
+        ticker_dtype = None
+        if 'ticker' in selected:
+            ticker_dtype = pd.CategoricalDtype(sorted(tickers) if tickers is not None else self.get_tickers(conn, table))
+        return selected, query, params, ticker_dtype
+
+
+    @staticmethod
+    def get_tickers(conn, table):
+        """
+        Sorted distinct tickers of a table (read from the (ticker, date) index where there is one).
+        """
+        return [row[0] for row in conn.execute(f"SELECT DISTINCT ticker FROM {table} WHERE ticker IS NOT NULL ORDER BY ticker")]
+
+
+    @staticmethod
+    def convert_chunk(chunk, ticker_dtype, float32=False):
+        """
+        Compact dtypes for a chunk read from SQLite: categorical ticker, datetime64 date/datetime, optional float32.
+        """
+        if ticker_dtype is not None:
+            chunk['ticker'] = chunk['ticker'].astype(ticker_dtype)
+        for column in ('date', 'datetime'):
+            if column in chunk.columns:
+                chunk[column] = pd.to_datetime(chunk[column], errors='coerce')
+        if float32:
+            float_columns = chunk.select_dtypes(include='float64').columns
+            chunk[float_columns] = chunk[float_columns].astype('float32')
+        return chunk
+
+
+    def load_table(self, database, table, columns=None, tickers=None, start_date=None, end_date=None, chunksize=100000, float32=False):
+        """
+        Reads one table into a DataFrame with the filters pushed into SQL (see get_database_tables).
+        """
+        conn = sqlite3.connect(database)
+        selected, query, params, ticker_dtype = self.table_query(conn, table, columns, tickers, start_date, end_date)
+
+        chunks = [self.convert_chunk(chunk, ticker_dtype, float32) for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize)]
+        conn.close()
+
+        if not chunks:
+            return pd.DataFrame(columns=selected)
+        self.logger.output(f"Loaded {table} from {database}: {sum(len(chunk) for chunk in chunks)} rows.")
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+    def stream_table(self, database, table="ohlcv_market_caps_daily", columns=None, tickers=None, start_date=None, end_date=None,
+                     chunksize=100000, float32=False):
+        """
+        Yields a table as date-ordered DataFrame chunks of about `chunksize` rows (same filters & dtypes as
+        load_table) without ever holding the whole table. A date is never split across chunks: the rows of
+        the last date read are held back & prepended to the next chunk.
+        """
+        conn = sqlite3.connect(database)
+        selected, query, params, ticker_dtype = self.table_query(conn, table, columns, tickers, start_date, end_date)
+        if 'date' not in selected:
+            conn.close()
+            raise ValueError(f"Cannot stream {table} in date order without a 'date' column")
+
+        carry = None
+        try:
+            for chunk in pd.read_sql(f"{query} ORDER BY date", conn, params=params, chunksize=chunksize):
+                if carry is not None:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                last_date = chunk['date'].iloc[-1]
+                complete = (chunk['date'] != last_date).to_numpy()
+                carry = chunk[~complete]
+                if complete.any():
+                    yield self.convert_chunk(chunk[complete].reset_index(drop=True), ticker_dtype, float32)
+            if carry is not None and len(carry):
+                yield self.convert_chunk(carry.reset_index(drop=True), ticker_dtype, float32)
+        finally:
+            conn.close()
+
+
+    def stream_shards(self, databases, table="ohlcv_market_caps_daily", columns=None, tickers=None, start_date=None, end_date=None,
+                      chunksize=100000, float32=False):
+        """
+        stream_table over several shards, merged by date: yields date-ordered chunks holding every shard's rows
+        of each date they contain. Each shard is streamed on its own & rows are released up to the earliest last
+        date buffered across shards, which every shard has then fully delivered. With a ticker filter only the
+        shards holding those tickers are read. Every chunk's ticker column has the same categorical dtype, whose
+        categories are the tickers of every streamed shard (the stream's universe).
+        """
+        databases = self.holding_shards(databases, tickers)
+        if len(databases) == 1:
+            yield from self.stream_table(databases[0], table, columns, tickers, start_date, end_date, chunksize, float32)
+            return
+
+        streams = {database: self.stream_table(database, table, columns, tickers, start_date, end_date, chunksize, float32)
+                   for database in databases}
+        buffers = {database: next(streams[database], None) for database in databases}
+        # Every chunk of a shard shares that shard's ticker dtype, so the first chunks give the merged one
+        ticker_dtype = self.shard_ticker_dtype([buffer for buffer in buffers.values() if buffer is not None])
+        while True:
+            # Every shard still streaming needs buffered rows to know how far it has been read
+            for database in list(streams):
+                if buffers[database] is None:
+                    buffers[database] = next(streams[database], None)
+                    if buffers[database] is None:
+                        del streams[database]
+            buffered = {database: buffer for database, buffer in buffers.items() if buffer is not None}
+            if not buffered:
+                break
+            boundary = min(buffers[database]['date'].iloc[-1] for database in streams) if streams else None
+
+            parts = []
+            for database, buffer in buffered.items():
+                ready = (buffer['date'] <= boundary).to_numpy() if boundary is not None else np.ones(len(buffer), dtype=bool)
+                parts.append(buffer[ready])
+                buffers[database] = buffer[~ready] if not ready.all() else None
+            chunk = self.concat_shards([part for part in parts if len(part)], ticker_dtype)
+            yield chunk.sort_values('date', kind='stable', ignore_index=True)
+
+
+    def get_first_rows(self, database, table="ohlcv_market_caps_daily", columns=None, tickers=None, start_date=None, end_date=None):
+        """
+        Each ticker's first row (by date) within the filters, e.g. the entry prices of a streamed buy-and-hold backtest.
+        Uses the (ticker, date) index, so it costs O(tickers) rather than a pass over the table.
+        """
+        conn = sqlite3.connect(database)
+        selected, query, params, ticker_dtype = self.table_query(conn, table, columns, tickers, start_date, end_date)
+        first = f"SELECT ticker, MIN(date) AS date FROM ({query}) GROUP BY ticker"
+        rows = pd.read_sql(f"SELECT t.* FROM ({query}) AS t JOIN ({first}) AS f ON (t.ticker = f.ticker AND t.date = f.date)",
+                           conn, params=params + params)
+        conn.close()
+        return self.convert_chunk(rows, ticker_dtype)
+
+
+class LazyTables(Mapping):
+    """
+    Read-only dictionary of table name -> DataFrame that loads each table on first access.
+    """
+    def __init__(self):
+        self.loaders = {}
+        self.tables = {}
+
+    def register(self, name, loader):
+        self.loaders[name] = loader
+
+    def is_loaded(self, name):
+        return name in self.tables
+
+    def __getitem__(self, name):
+        if name not in self.tables:
+            self.tables[name] = self.loaders[name]()
+        return self.tables[name]
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+    def __len__(self):
+        return len(self.loaders)
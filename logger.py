@@ -1,25 +1,151 @@
-import os
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, message & any structured fields passed to Logger.output().
+    """
+    def format(self, record):
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as they are. The queue never leaves the process, so the formatting & copying that
+    QueueHandler.prepare() does to make records picklable would only slow down the logging thread.
+    """
+    def prepare(self, record):
+        return record
+
+
+class Span:
+    """
+    Timing of one pipeline stage, see Logger.span(). Add processed items with add() (or set `count`).
+    """
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.count = None
+        self.start = time.perf_counter()
+        self.seconds = None
+
+    def add(self, count=1):
+        self.count = (self.count or 0) + count
+
+    def record(self):
+        record = {"span": self.name, "seconds": round(self.seconds, 6), **self.fields}
+        if self.count is not None:
+            record["count"] = self.count
+            record["per_second"] = round(self.count / self.seconds, 3) if self.seconds else None
+        return record
+
+
 class Logger:
-    def __init__(self, project_name, version_number):
+    def __init__(self, project_name, version_number, asynchronous=True, json_lines=False, console_level="info", file_level="debug"):
+        """
+        asynchronous  - records are handed to a QueueListener thread, so output() never waits on file or console I/O
+        json_lines    - write the log file as JSON lines (.jsonl) instead of text
+        console_level - lowest level printed to the console (e.g. "warning" to keep long runs quiet)
+        file_level    - lowest level written to the log file
+        """
         self.project_name = project_name
         self.version_number = version_number
+        self.asynchronous = asynchronous
+        self.json_lines = json_lines
+        self.console_level = console_level
+        self.file_level = file_level
+        self.spans = []
+        self.listener = None
         self.setup_logging()
 
     def setup_logging(self):
         os.makedirs('logs', exist_ok=True)
-        log_filename = f"logs/{self.project_name}_v{self.version_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        logging.basicConfig(
-            filename=log_filename,
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        self.logger = logging.getLogger()
-
-    def output(self, message, log_level="info"):
-        log_method = getattr(self.logger, log_level.lower(), self.logger.info)
-        log_method(message)
-        print(message)
\ No newline at end of file
+        extension = "jsonl" if self.json_lines else "log"
+        self.log_filename = f"logs/{self.project_name}_v{self.version_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+        file_handler = logging.FileHandler(self.log_filename)
+        file_handler.setLevel(self.file_level.upper())
+        file_handler.setFormatter(JsonLinesFormatter() if self.json_lines else logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(self.console_level.upper())
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+
+        self.logger = logging.getLogger(f"{self.project_name}.{id(self)}")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.handlers = [file_handler, console_handler]
+        if self.asynchronous:
+            records = queue.SimpleQueue()
+            self.logger.addHandler(LocalQueueHandler(records))
+            self.listener = logging.handlers.QueueListener(records, file_handler, console_handler, respect_handler_level=True)
+            self.listener.start()
+        else:
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(console_handler)
+        atexit.register(self.close)
+
+    def output(self, message, log_level="info", **fields):
+        """
+        Logs a message to the log file & console. Keyword arguments are kept as structured fields (JSON lines output).
+        """
+        level = logging.getLevelName(log_level.upper())
+        self.logger.log(level if isinstance(level, int) else logging.INFO, message, extra={"fields": fields})
+
+    @contextmanager
+    def span(self, name, **fields):
+        """
+        Times a pipeline stage:
+            with logger.span("procure_data", tickers=len(TICKERS)) as span:
+                ...
+                span.add(rows)
+        The duration, count & throughput are logged when the block exits & kept for summary().
+        """
+        span = Span(name, fields)
+        self.output(f"[{name}] started.", "debug", span=name, **fields)
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - span.start
+            self.spans.append(span)
+            throughput = f", {span.count} items, {span.count / span.seconds:,.1f}/s" if span.count is not None and span.seconds else ""
+            self.output(f"[{name}] finished in {span.seconds:.3f}s{throughput}.", **span.record())
+
+    def summary(self):
+        """
+        Logs a table of every finished span & writes it to <log file>.summary.json. Returns the span records.
+        """
+        records = [span.record() for span in self.spans]
+        lines = [f"{'stage':<28}{'seconds':>12}{'count':>12}{'per second':>14}"]
+        for record in records:
+            count = record.get("count")
+            per_second = record.get("per_second")
+            lines.append(f"{record['span']:<28}{record['seconds']:>12.3f}{'' if count is None else count:>12}"
+                         f"{'' if per_second is None else f'{per_second:,.1f}':>14}")
+        self.output("Run summary:\n" + "\n".join(lines), summary=records)
+        with open(f"{os.path.splitext(self.log_filename)[0]}.summary.json", "w") as f:
+            json.dump({"project": self.project_name, "version": self.version_number, "spans": records}, f, indent=2, default=str)
+        return records
+
+    def close(self):
+        """
+        Flushes queued records & stops the listener thread (also run at interpreter exit).
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for handler in self.handlers:
+            handler.close()
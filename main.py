@@ -1,6 +1,9 @@
 from datetime import datetime
 from logger import Logger
 from database_manager import DatabaseManager
+from data_validator import DataValidator
+from response_cache import ResponseCache
+from snapshot_cache import SnapshotCache
 from strategy_manager import StrategyManager
 
 
@@ -12,32 +15,54 @@ def main():
     VERSION_NUMBER = "0.0.7"
     START_DATE = "2025-09-22" 
     END_DATE = "2025-09-26"
-    DATABASES = ['database.db']
+    DATABASES = ['database.db']  # Several files (e.g. ['database_0.db', 'database_1.db']) shard the tickers across them
     TABLES = ['ohlcv_daily', 'market_caps_daily']
     TICKERS = ['JPM', 'GS', 'WFC', 'MS', 'C', 'BAC']
+    REQUESTS_PER_MINUTE = 5  # polygon.io plan limit (free tier: 5)
+    MARKET_CAP_METHOD = 'snapshots'  # 'snapshots' (request share counts only where they change) or 'daily'
+    RESPONSE_CACHE = 'response_cache.db'
+    CACHE_MODE = 'read_write'  # 'read_write', 'replay' (offline, recorded responses only) or None to disable
+    SNAPSHOT_DIR = 'snapshots'  # Memory-mapped snapshots of the joined panel, or None to always read from SQLite
 
     ### LOGGER
     logger = Logger(PROJECT_NAME, VERSION_NUMBER)
     logger.output(f"{PROJECT_NAME} v{VERSION_NUMBER} started.")
     
     ### DATABASE
-    database_manager = DatabaseManager(DATABASES, TABLES, TICKERS, logger)
-    database_manager.initialize_database()
+    response_cache = ResponseCache(RESPONSE_CACHE, mode=CACHE_MODE) if CACHE_MODE else None
+    database_manager = DatabaseManager(DATABASES, TABLES, TICKERS, logger, requests_per_minute=REQUESTS_PER_MINUTE,
+                                       response_cache=response_cache, market_cap_method=MARKET_CAP_METHOD)
+    with logger.span("initialize_database", databases=len(DATABASES), tables=len(TABLES)):
+        database_manager.initialize_database()
     unique_dates = database_manager.get_unique_dates(START_DATE, END_DATE)
-    database_manager.procure_data(START_DATE, END_DATE, unique_dates)
-    database_manager.join_tables()
-    database_tables = database_manager.get_database_tables()
+    with logger.span("procure_data", tickers=len(TICKERS), trading_days=len(unique_dates)) as span:
+        database_manager.procure_data(START_DATE, END_DATE, unique_dates, incremental=True)
+        span.add(database_manager.client.requests_sent)  # HTTP requests
+    with logger.span("join_tables"):
+        database_manager.join_tables()
+    with logger.span("validate") as span:
+        validation_report = DataValidator(DATABASES, logger).validate()
+        validation_report.to_csv("validation_report.csv", index=False)
+        span.add(len(validation_report))  # (table, check, ticker) issues
+    snapshot_cache = SnapshotCache(SNAPSHOT_DIR, logger) if SNAPSHOT_DIR else None
+    database_tables = database_manager.get_database_tables(snapshot_cache=snapshot_cache)
 
     ### STRATEGY
     strategy_manager = StrategyManager(database_tables, logger)
-    strategy_manager.check_for_duplicates()
-    strategy_manager.summarize()
-    strategy_manager.create_strategies(["market_cap_weighted", "equal_weighted"])
-    strategy_manager.plot_histograms()
+    with logger.span("create_strategies") as span:
+        strategy_manager.create_strategies(["market_cap_weighted", "equal_weighted", "market_cap_weighted_monthly", "equal_weighted_monthly"])
+        span.add(len(strategy_manager.results))  # Backtests
+    with logger.span("summarize") as span:
+        span.add(len(strategy_manager.summarize()))
+    with logger.span("plot_histograms") as span:
+        rendered, skipped = strategy_manager.plot_histograms()
+        span.add(rendered)  # Figures rendered (unchanged ones are skipped)
 
     ### END
     runtime = datetime.now() - start_time
     logger.output(f"{PROJECT_NAME} completed. Runtime: {runtime}")
+    logger.summary()
+    logger.close()
 
 
 if __name__ == "__main__":
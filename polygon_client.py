@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from requests.adapters import HTTPAdapter
+
+POLYGON_BASE_URL = "https://api.polygon.io"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker that talks to the same API key.
+    Holds up to `capacity` tokens & refills at `requests_per_minute` / 60 tokens per second. The default
+    capacity of 1 paces requests evenly, so no 60 second window ever sees more than `requests_per_minute`
+    of them; a larger capacity allows bursts that a per-minute server window counts on top of the steady rate.
+    """
+    def __init__(self, requests_per_minute, capacity=1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then consumes it. Returns the seconds spent waiting.
+        """
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                wait_for = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+                self.condition.wait(wait_for)
+
+
+    def penalize(self, seconds):
+        """
+        Empties the bucket & pauses every worker for `seconds` (e.g. after a 429 Retry-After).
+        """
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.condition.notify_all()
+
+
+class PolygonClient:
+    """
+    Pooled, rate limited HTTP client for polygon.io.
+    Every request (single or concurrent) draws from one shared TokenBucket, so the plan's
+    requests-per-minute budget is respected while keeping the worker pool busy. `burst` is the bucket capacity
+    (1 = evenly paced, which never exceeds the plan's per-minute window). `callers` is the number of
+    threads that may run fetch_many() at the same time (e.g. one per database shard).
+    """
+    def __init__(self, api_key, logger, requests_per_minute=5, burst=1, max_workers=None,
+                 base_url=POLYGON_BASE_URL, max_retries=5, timeout=30, cache=None, callers=1):
+        self.api_key = api_key
+        self.logger = logger
+        self.cache = cache
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.requests_per_minute = requests_per_minute
+        self.requests_sent = 0  # HTTP requests actually sent (cache hits excluded)
+        self.counter_lock = threading.Lock()
+
+        # requests_per_minute=None means an unlimited plan - concurrency is then bounded by max_workers only
+        if requests_per_minute:
+            self.bucket = TokenBucket(requests_per_minute, burst)
+            self.max_workers = max_workers or max(1, min(32, requests_per_minute))
+        else:
+            self.bucket = None
+            self.max_workers = max_workers or 8
+
+        # Keep-alive connection pool sized to the number of workers of every concurrent fetch_many() caller
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers * callers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+
+    def _with_api_key(self, url):
+        """
+        Appends the apiKey query parameter unless the URL already carries one.
+        """
+        if not self.api_key:
+            return url
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        if any(key == "apiKey" for key, _ in query):
+            return url
+        query.append(("apiKey", self.api_key))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+    def get(self, url):
+        """
+        Rate limited GET request. Retries on HTTP 429, honouring the server's Retry-After header.
+        Cache hits (see ResponseCache) are served without using the rate limit budget.
+        """
+        if self.cache is not None:
+            data = self.cache.get(url)
+            if data is not None:
+                return data
+
+        for attempt in range(self.max_retries + 1):
+            if self.bucket:
+                self.bucket.acquire()
+            with self.counter_lock:
+                self.requests_sent += 1
+            response = self.session.get(self._with_api_key(url), timeout=self.timeout)
+
+            if response.status_code == 429 and attempt < self.max_retries:
+                default_wait = 60.0 / self.requests_per_minute if self.requests_per_minute else 1.0
+                retry_after = float(response.headers.get("Retry-After", default_wait))
+                self.logger.output(f"Rate limited by server, retrying in {retry_after:.1f}s...", "warning")
+                if self.bucket:
+                    self.bucket.penalize(retry_after)
+                else:
+                    time.sleep(retry_after)
+                continue
+
+            response.raise_for_status()
+            data = response.json()
+            if self.cache is not None:
+                self.cache.put(url, data)
+            return data
+
+
+    def fetch_many(self, jobs, follow_next_url=False):
+        """
+        Runs GET requests concurrently. `jobs` is an iterable of (key, url) pairs.
+        Yields (key, data) in completion order; data is None if the request failed.
+        At most 2 x max_workers requests are queued at once, so `jobs` may be a lazy generator.
+        With follow_next_url=True every page of a paginated response is yielded under the same key;
+        the page without a next_url is the last one for that key.
+        """
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="polygon") as executor:
+            pending = {}
+
+            def submit_next():
+                for key, url in jobs:
+                    pending[executor.submit(self.get, url)] = (key, url)
+                    return True
+                return False
+
+            while len(pending) < 2 * self.max_workers and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, url = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except requests.RequestException as e:
+                        self.logger.output(f"Failed to get data from {url}: {e}", "error")
+                        data = None
+                    if follow_next_url and data is not None and data.get('next_url'):
+                        pending[executor.submit(self.get, data['next_url'])] = (key, data['next_url'])
+                    else:
+                        submit_next()
+                    yield key, data
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+CACHE_MODES = ("read_write", "replay")
+
+
+class CacheMissError(LookupError):
+    """
+    Raised in replay mode when a URL has no recorded response.
+    """
+
+
+class ResponseCache:
+    """
+    Content-addressed, zlib-compressed cache of JSON API responses stored in SQLite.
+
+    Entries are keyed on the URL with its apiKey removed & query parameters sorted. Responses whose
+    URL only references dates before today are historical & never expire. Responses for today or later
+    may still be incomplete (e.g. requested before the close), so they are recorded for replay but never
+    served in read_write mode. Responses without dates expire after `ttl_seconds`. Once the cache
+    exceeds `max_bytes` the least recently used entries are evicted (expiring entries first).
+
+    mode="read_write" serves hits & records misses. mode="replay" never touches the network:
+    a miss raises CacheMissError, so pipelines run offline & deterministically from recorded responses.
+    """
+    def __init__(self, path="response_cache.db", mode="read_write", ttl_seconds=86400, max_bytes=2 * 1024 ** 3):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("PRAGMA synchronous=NORMAL;")
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                body BLOB,
+                size INTEGER,
+                created_at REAL,
+                last_access REAL,
+                expires_at REAL
+            )
+        ''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_responses_eviction ON responses (expires_at IS NULL, last_access)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+    @staticmethod
+    def normalize_url(url):
+        """
+        Drops the apiKey parameter & sorts the remaining query so equivalent URLs share one key.
+        """
+        parts = urlsplit(url)
+        query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "apiKey")
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+    def key(self, url):
+        return hashlib.sha256(self.normalize_url(url).encode()).hexdigest()
+
+
+    @staticmethod
+    def today():
+        """
+        Today's date in the earliest time zone (UTC-12), so a date counts as today until it has ended everywhere
+        - including New York, where the trading day of a UTC date may still be running.
+        """
+        return (datetime.now(timezone.utc) - timedelta(hours=12)).strftime("%Y-%m-%d")
+
+
+    @classmethod
+    def is_immutable(cls, url):
+        """
+        True when every date referenced in the URL is before today, i.e. the response is historical.
+        """
+        dates = DATE_PATTERN.findall(url)
+        return bool(dates) and max(dates) < cls.today()
+
+
+    @classmethod
+    def is_live(cls, url):
+        """
+        True when the URL references today or a later date, i.e. the response may still change.
+        """
+        dates = DATE_PATTERN.findall(url)
+        return bool(dates) and max(dates) >= cls.today()
+
+
+    def get(self, url):
+        """
+        Returns the cached response for `url`, or None on a miss. Raises CacheMissError on a miss in replay mode.
+        """
+        key = self.key(url)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[1] is None or row[1] > now or self.mode == "replay"):
+                self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self.connection.commit()
+                self.hits += 1
+                return json.loads(zlib.decompress(row[0]))
+            self.misses += 1
+
+        if self.mode == "replay":
+            raise CacheMissError(f"No recorded response for {self.normalize_url(url)}")
+        return None
+
+
+    def put(self, url, data):
+        """
+        Records a response, then evicts least recently used entries while the cache exceeds max_bytes.
+        """
+        if self.mode == "replay":
+            return
+        key = self.key(url)
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+        now = time.time()
+        if self.is_immutable(url):
+            expires_at = None
+        elif self.is_live(url):
+            expires_at = now  # Kept for replay only, so a later request refetches today's (possibly partial) data
+        else:
+            expires_at = now + self.ttl_seconds
+
+        with self.lock:
+            previous = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, size, created_at, last_access, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, self.normalize_url(url), body, len(body), now, now, expires_at)
+            )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                self._evict()
+            self.connection.commit()
+
+
+    def _evict(self):
+        """
+        Deletes entries (expiring ones first, then least recently used) until the cache fits in max_bytes.
+        """
+        cursor = self.connection.execute(
+            "SELECT key, size FROM responses ORDER BY expires_at IS NULL, last_access"
+        )
+        evict = []
+        for key, size in cursor:
+            if self.total_bytes <= self.max_bytes:
+                break
+            evict.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import numpy as np
+import pandas as pd
+
+
+class SnapshotCache:
+    """
+    Columnar on-disk snapshots of loaded tables, stored as one .npy file per column & memory-mapped on load.
+
+    A snapshot is valid while the fingerprint of the snapshotted table (max rowid & refresh watermarks) and the load arguments are unchanged; otherwise it is rebuilt from SQLite on the next load. Memory-mapped columns
+    are read-only & backed by the OS page cache, so concurrent backtest processes share the same pages.
+    Text columns are stored as categoricals (integer codes + a categories list) so they can be mapped too.
+    """
+    def __init__(self, directory, logger, tables=("ohlcv_market_caps_daily",)):
+        self.directory = directory
+        self.logger = logger
+        self.tables = tables
+
+
+    def fingerprint(self, database, table, load_args):
+        """
+        Hash of the snapshotted table's state plus the arguments used to load it. The state is the table's
+        MAX(rowid) (rows replaced by a join refresh are deleted & re-inserted under new rowids) and its
+        refresh_state watermarks (the source row ids join_tables has merged), so a snapshot taken before a join
+        differs from one taken after it. Both are index lookups, so fingerprinting costs the same at any table
+        size. `database` may be a list of shards, whose states are all hashed.
+        """
+        state = {}
+        for shard in ([database] if isinstance(database, str) else database):
+            conn = sqlite3.connect(shard)
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+            state[os.path.abspath(shard)] = {
+                "table": conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] if table in existing else None,
+                "refresh_state": conn.execute("SELECT name, value FROM refresh_state WHERE name LIKE ? ORDER BY name",
+                                              (f"{table}.%",)).fetchall() if "refresh_state" in existing else [],
+            }
+            conn.close()
+        payload = json.dumps({"state": state, "load_args": load_args}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+    def load(self, database, table, loader, load_args=None, name=None):
+        """
+        Returns the table from its snapshot, rebuilding the snapshot with loader() when it is missing or stale.
+        `database` is a path or a list of shards; the snapshot is named '<name>_<table>' (name defaults to the
+        database file name).
+        """
+        name = name or os.path.splitext(os.path.basename(database))[0]
+        path = os.path.join(self.directory, f"{name}_{table}")
+        fingerprint = self.fingerprint(database, table, load_args)
+        manifest = self.read_manifest(path)
+
+        if manifest is None or manifest['fingerprint'] != fingerprint:
+            self.logger.output(f"Snapshot of {table} ({database}) is stale, rebuilding...")
+            self.write(path, loader(), fingerprint)
+            manifest = self.read_manifest(path)
+        else:
+            self.logger.output(f"Loading {table} ({database}) from snapshot {path}.")
+        return self.read(path, manifest)
+
+
+    @staticmethod
+    def read_manifest(path):
+        try:
+            with open(os.path.join(path, "manifest.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+
+    def write(self, path, df, fingerprint):
+        """
+        Writes one .npy per column; the manifest is written last & marks the snapshot complete.
+        """
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        columns = []
+        for i, column in enumerate(df.columns):
+            series = df[column]
+            if not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_dtype(series)
+                    or isinstance(series.dtype, pd.CategoricalDtype)):
+                series = series.astype('category')
+
+            entry = {"name": column, "file": f"{i}.npy"}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                entry["categories"] = [str(category) for category in series.cat.categories]
+                np.save(os.path.join(path, entry["file"]), series.array.codes)
+            else:
+                np.save(os.path.join(path, entry["file"]), series.to_numpy())
+            columns.append(entry)
+
+        with open(os.path.join(path, "manifest.json"), "w") as f:
+            json.dump({"fingerprint": fingerprint, "rows": len(df), "columns": columns}, f)
+
+
+    @staticmethod
+    def read(path, manifest):
+        """
+        Builds a DataFrame over memory-mapped columns without copying them.
+        """
+        data = {}
+        for entry in manifest['columns']:
+            values = np.load(os.path.join(path, entry['file']), mmap_mode='r')
+            if "categories" in entry:
+                values = pd.Categorical.from_codes(values, dtype=pd.CategoricalDtype(entry['categories']), validate=False)
+            data[entry['name']] = pd.Series(values, copy=False)
+        return pd.DataFrame(data, copy=False)
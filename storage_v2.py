@@ -0,0 +1,211 @@
+import sqlite3
+import sys
+import time
+
+EPOCH_DAY = "CAST(julianday({column}) - 2440587.5 AS INTEGER)"  # YYYY-MM-DD text -> days since 1970-01-01
+
+
+class StorageV2:
+    """
+    Compact storage layout for ohlcv_daily & market_caps_daily.
+
+    - tickers: ticker dimension, rows reference it by integer ticker_id
+    - ingestion_batches: one row per API response (request_id, resultsCount, etl_datetime)
+    - ohlcv_daily_v2 / market_caps_daily_v2: WITHOUT ROWID tables keyed on (ticker_id, day), where day is
+      the integer epoch day, so the primary key is the only index & a (ticker, date) can hold one value
+    - ohlcv_daily_view / market_caps_daily_view: the v1 column contract (ticker, date, ...) for readers
+    """
+    def __init__(self, database, logger):
+        self.database = database
+        self.logger = logger
+
+
+    def connect(self):
+        connection = sqlite3.connect(self.database)
+        connection.execute("PRAGMA journal_mode=WAL;")
+        connection.execute("PRAGMA synchronous=NORMAL;")
+        return connection
+
+
+    def initialize_database(self):
+        """
+        Creates the v2 tables & compatibility views.
+        """
+        connection = self.connect()
+        connection.executescript('''
+            CREATE TABLE IF NOT EXISTS tickers (
+                ticker_id INTEGER PRIMARY KEY,
+                ticker TEXT NOT NULL UNIQUE
+            );
+
+            CREATE TABLE IF NOT EXISTS ingestion_batches (
+                batch_id INTEGER PRIMARY KEY,
+                request_id TEXT UNIQUE,
+                results_count INTEGER,
+                etl_datetime TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS ohlcv_daily_v2 (
+                ticker_id INTEGER NOT NULL REFERENCES tickers (ticker_id),
+                day INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume INTEGER,
+                volume_weighted REAL,
+                trades INTEGER,
+                batch_id INTEGER REFERENCES ingestion_batches (batch_id),
+                PRIMARY KEY (ticker_id, day)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS market_caps_daily_v2 (
+                ticker_id INTEGER NOT NULL REFERENCES tickers (ticker_id),
+                day INTEGER NOT NULL,
+                share_class_shares_outstanding INTEGER,
+                weighted_shares_outstanding INTEGER,
+                market_cap REAL,
+                batch_id INTEGER REFERENCES ingestion_batches (batch_id),
+                PRIMARY KEY (ticker_id, day)
+            ) WITHOUT ROWID;
+
+            CREATE VIEW IF NOT EXISTS ohlcv_daily_view AS
+                SELECT t.ticker, date(o.day * 86400, 'unixepoch') AS date, o.open, o.high, o.low, o.close,
+                       o.volume, o.volume_weighted, o.trades, b.request_id, b.etl_datetime
+                FROM ohlcv_daily_v2 AS o
+                JOIN tickers AS t USING (ticker_id)
+                LEFT JOIN ingestion_batches AS b USING (batch_id);
+
+            CREATE VIEW IF NOT EXISTS market_caps_daily_view AS
+                SELECT t.ticker, date(m.day * 86400, 'unixepoch') AS date, m.share_class_shares_outstanding,
+                       m.weighted_shares_outstanding, m.market_cap, b.request_id, b.etl_datetime
+                FROM market_caps_daily_v2 AS m
+                JOIN tickers AS t USING (ticker_id)
+                LEFT JOIN ingestion_batches AS b USING (batch_id);
+        ''')
+        connection.commit()
+        connection.close()
+        self.logger.output(f"v2 storage layout in {self.database} is initialized.")
+
+
+    def migrate(self, source_database):
+        """
+        Copies a v1 database (ohlcv_daily & market_caps_daily) into the v2 layout.
+        Where v1 holds several rows for one (ticker, date), the most recently inserted row wins.
+        """
+        self.initialize_database()
+        connection = self.connect()
+        connection.execute("ATTACH DATABASE ? AS source", (source_database,))
+        source_tables = {row[0] for row in connection.execute("SELECT name FROM source.sqlite_master WHERE type = 'table'")}
+        start = time.perf_counter()
+
+        with connection:
+            for table in ("ohlcv_daily", "market_caps_daily"):
+                if table not in source_tables:
+                    self.logger.output(f"Skipping {table} — not found in {source_database}.")
+                    continue
+                connection.execute(f"INSERT OR IGNORE INTO tickers (ticker) SELECT DISTINCT ticker FROM source.{table} ORDER BY ticker")
+                results_count = "MAX(resultsCount)" if table == "ohlcv_daily" else "NULL"
+                connection.execute(f'''
+                    INSERT OR IGNORE INTO ingestion_batches (request_id, results_count, etl_datetime)
+                    SELECT request_id, {results_count}, MIN(etl_datetime) FROM source.{table} GROUP BY request_id ORDER BY MIN(id)
+                ''')
+
+            if "ohlcv_daily" in source_tables:
+                connection.execute(f'''
+                    INSERT OR REPLACE INTO ohlcv_daily_v2 (ticker_id, day, open, high, low, close, volume, volume_weighted, trades, batch_id)
+                    SELECT t.ticker_id, {EPOCH_DAY.format(column="o.date")}, o.open, o.high, o.low, o.close,
+                           o.volume, o.volume_weighted, o.trades, b.batch_id
+                    FROM source.ohlcv_daily AS o
+                    JOIN tickers AS t ON t.ticker = o.ticker
+                    LEFT JOIN ingestion_batches AS b ON b.request_id = o.request_id
+                    ORDER BY o.id
+                ''')
+
+            if "market_caps_daily" in source_tables:
+                connection.execute(f'''
+                    INSERT OR REPLACE INTO market_caps_daily_v2 (ticker_id, day, share_class_shares_outstanding, weighted_shares_outstanding, market_cap, batch_id)
+                    SELECT t.ticker_id, {EPOCH_DAY.format(column="m.date")}, m.share_class_shares_outstanding,
+                           m.weighted_shares_outstanding, m.market_cap, b.batch_id
+                    FROM source.market_caps_daily AS m
+                    JOIN tickers AS t ON t.ticker = m.ticker
+                    LEFT JOIN ingestion_batches AS b ON b.request_id = m.request_id
+                    ORDER BY m.id
+                ''')
+
+        connection.execute("DETACH DATABASE source")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        connection.execute("VACUUM;")
+        connection.close()
+        self.logger.output(f"Migrated {source_database} to v2 layout in {self.database} ({time.perf_counter() - start:.2f}s).")
+
+
+    @staticmethod
+    def table_bytes(connection, tables):
+        """
+        Bytes of the pages holding `tables` & their indexes, from the dbstat virtual table.
+        """
+        placeholders = ", ".join("?" * len(tables))
+        size = connection.execute(f'''
+            SELECT SUM(pgsize) FROM dbstat
+            WHERE name IN (SELECT name FROM sqlite_master WHERE type IN ('table', 'index') AND tbl_name IN ({placeholders}))
+        ''', tables).fetchone()[0]
+        return size or 0
+
+
+    def report(self, source_database, repeat=5):
+        """
+        Compares the size of the migrated tables (& their indexes) & typical query times of a v1 database
+        against this v2 database. Tables that are not migrated (e.g. ohlcv_market_caps_daily) are left out.
+        Returns a list of (metric, v1, v2) rows.
+        """
+        queries = {
+            "join ohlcv x market caps": (
+                "SELECT COUNT(*), SUM(o.close * m.market_cap) FROM ohlcv_daily AS o JOIN market_caps_daily AS m ON o.ticker = m.ticker AND o.date = m.date",
+                "SELECT COUNT(*), SUM(o.close * m.market_cap) FROM ohlcv_daily_v2 AS o JOIN market_caps_daily_v2 AS m USING (ticker_id, day)",
+            ),
+            "one ticker, one year of closes": (
+                "SELECT date, close FROM ohlcv_daily WHERE ticker = :ticker AND date BETWEEN :start AND :end",
+                "SELECT day, close FROM ohlcv_daily_v2 WHERE ticker_id = (SELECT ticker_id FROM tickers WHERE ticker = :ticker) "
+                f"AND day BETWEEN {EPOCH_DAY.format(column=':start')} AND {EPOCH_DAY.format(column=':end')}",
+            ),
+            "point lookup (ticker, date)": (
+                "SELECT close FROM ohlcv_daily WHERE ticker = :ticker AND date = :end",
+                "SELECT close FROM ohlcv_daily_v2 WHERE ticker_id = (SELECT ticker_id FROM tickers WHERE ticker = :ticker) "
+                f"AND day = {EPOCH_DAY.format(column=':end')}",
+            ),
+        }
+
+        v1 = sqlite3.connect(source_database)
+        v2 = sqlite3.connect(self.database)
+        ticker, end = v1.execute("SELECT ticker, MAX(date) FROM ohlcv_daily GROUP BY ticker LIMIT 1").fetchone()
+        params = {"ticker": ticker, "start": f"{int(end[:4]) - 1}{end[4:]}", "end": end}
+
+        def best_time(connection, query):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                connection.execute(query, params).fetchall()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        v1_size = self.table_bytes(v1, ("ohlcv_daily", "market_caps_daily"))
+        v2_size = self.table_bytes(v2, ("tickers", "ingestion_batches", "ohlcv_daily_v2", "market_caps_daily_v2"))
+        rows = [("migrated tables size (MB)", v1_size / 1e6, v2_size / 1e6)]
+        for name, (v1_query, v2_query) in queries.items():
+            rows.append((f"{name} (ms)", best_time(v1, v1_query) * 1000, best_time(v2, v2_query) * 1000))
+        v1.close()
+        v2.close()
+
+        for metric, before, after in rows:
+            self.logger.output(f"{metric:<36} v1 {before:>10.3f} | v2 {after:>10.3f} | {before / after if after else float('inf'):>6.1f}x")
+        return rows
+
+
+if __name__ == "__main__":
+    # python storage_v2.py database.db database_v2.db
+    from logger import Logger
+    logger = Logger("Aurelius_storage_v2", "0")
+    storage = StorageV2(sys.argv[2], logger)
+    storage.migrate(sys.argv[1])
+    storage.report(sys.argv[1])
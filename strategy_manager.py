@@ -1,6 +1,10 @@
-import matplotlib.pyplot as plt
 import pandas as pd
-import os
+from functools import partial
+from backtest_engine import (pivot_panel, run_buy_and_hold, run_rebalanced, portfolio_frame, positions_frame, StreamingBacktest,
+                             market_cap_weights, equal_weights, WEIGHTS, REBALANCE_FREQUENCIES)
+from sweep_runner import SweepRunner, resolve_strategy
+from analytics import performance_metrics, rolling_metrics, ticker_statistics
+from chart_renderer import ChartRenderer
 
 
 class StrategyManager:
@@ -8,50 +12,126 @@ class StrategyManager:
         self.data = data
         self.logger = logger
         self.results = {}
+        self.panels = {}  # id(df) -> (df, Panel), so each table is pivoted once
+        self.ticker_statistics = pd.DataFrame()
+        self.rolling_metrics = pd.DataFrame()
 
         # Register available strategies here
         self.strategies = {
             "market_cap_weighted": self.strategy_market_cap_weighted,
             "equal_weighted": self.strategy_equal_weighted,
         }
+        # Rebalanced variants, e.g. "market_cap_weighted_monthly" or "equal_weighted_drift"
+        for weighting in WEIGHTS:
+            for frequency in REBALANCE_FREQUENCIES:
+                self.strategies[f"{weighting}_{frequency}"] = partial(self.strategy_rebalanced, weighting=weighting, frequency=frequency)
 
 
     def check_for_duplicates(self):
         """
-        Checks data for duplicate ticker x [interval] rows.
+        Checks the loaded tables for duplicate ticker x [interval] rows. Returns {table: duplicated rows}.
+        Tables that are not loaded yet are left alone - see DataValidator for checks run inside the database.
         """
-        for df_name, df in self.data.items():
+        duplicates = {}
+        for df_name in self.data:
+            if hasattr(self.data, 'is_loaded') and not self.data.is_loaded(df_name):
+                continue
+            df = self.data[df_name]
             if not {'date', 'ticker'}.issubset(df.columns):
                 self.logger.output(f"Skipping {df_name} — missing 'date' or 'ticker' columns.")
                 continue
 
-            df = df.groupby(['date', 'ticker']).size().unstack(fill_value=0)
-            df = df[(df != 1).any(axis=1)]  # Filter to only show rows where ticker x [interval] count > 1
-            if df.empty:
-                self.logger.output("No duplicated data by ticker x [interval].")
+            duplicates[df_name] = df[df.duplicated(['date', 'ticker'], keep=False)]
+            if duplicates[df_name].empty:
+                self.logger.output(f"No duplicated data by ticker x [interval] in {df_name}.")
             else:
-                self.logger.output("WARNING: Duplicate data detected - see terminal for df.")
-                print(df)
+                self.logger.output(f"WARNING: {len(duplicates[df_name])} duplicated ticker x [interval] rows in {df_name} "
+                                   f"({duplicates[df_name]['ticker'].nunique()} tickers).", "warning")
+
+        return duplicates
 
-        return(df)
-    
 
-    def summarize(self):
+    def summarize(self, rolling_window=None, risk_free_rate=0.0):
         """
-        Gets summary & descriptive statistics for tickers from all tables. 
+        Performance & risk analytics (see analytics.py) for every backtest in self.results, including each run
+        of a sweep, plus per-ticker descriptive statistics for every loaded table. All runs are aligned into one
+        dates x runs matrix, so the metrics are computed in a single vectorized pass however many runs there are.
+        Returns one DataFrame with a row per run, indexed (table, strategy, run) where run is the sweep run_id
+        ("" for single backtests). Per-ticker statistics & the optional rolling metrics (over `rolling_window`
+        periods) are kept in self.ticker_statistics & self.rolling_metrics.
         """
-        print(type(self.data.items()))
-        for i, j in self.data.items():
-            print(type(i))
-            print(i)
-            print(type(j))
-            print(j)
+        values, turnover, initial_values = {}, {}, {}
+        for (df_name, strategy_name), result in self.results.items():
+            portfolio = result['portfolio']
+            if strategy_name == "sweep":
+                runs = result['data'].set_index('run_id')
+                for run_id in portfolio.columns:
+                    key = (df_name, runs.loc[run_id, 'strategy'], str(run_id))
+                    values[key] = portfolio[run_id]
+                    turnover[key] = result['turnover'][run_id]
+                    initial_values[key] = runs.loc[run_id, 'initial_portfolio_value']
+            elif not portfolio.empty:
+                portfolio = portfolio.set_index('date')
+                values[(df_name, strategy_name, "")] = portfolio['portfolio_value']
+                turnover[(df_name, strategy_name, "")] = portfolio['turnover']
+                initial_values[(df_name, strategy_name, "")] = result['initial_portfolio_value']
+
+        metrics = pd.DataFrame()
+        if values:
+            values, turnover = pd.DataFrame(values).sort_index(), pd.DataFrame(turnover).sort_index()
+            metrics = performance_metrics(values, turnover, initial_values, risk_free_rate=risk_free_rate)
+            metrics.index.names = ["table", "strategy", "run"]
+            if rolling_window:
+                self.rolling_metrics = rolling_metrics(values, rolling_window)
+            metrics.to_csv("performance_summary.csv")
+            self.logger.output(f"Performance of {len(metrics)} backtests (top 10 by Sharpe ratio, all in performance_summary.csv):\n"
+                               + metrics.sort_values('sharpe', ascending=False).head(10)[
+                                   ['final_value', 'annualized_return', 'annualized_volatility', 'sharpe', 'sortino', 'max_drawdown',
+                                    'max_drawdown_duration', 'mean_turnover']].to_string(float_format=lambda x: f"{x:,.4f}"))
+        else:
+            self.logger.output("No backtest results to summarize.")
+
+        # Per-ticker statistics, for tables already in memory only (a lazy table is not loaded just for this)
+        statistics = {}
+        for df_name in self.data:
+            if hasattr(self.data, 'is_loaded') and not self.data.is_loaded(df_name):
+                continue
+            df = self.data[df_name]
+            if not {'date', 'ticker', 'close'}.issubset(df.columns):
+                self.logger.output(f"Skipping ticker statistics for {df_name} — missing 'date', 'ticker' or 'close' columns.")
+                continue
+            statistics[df_name] = ticker_statistics(df)
+        if statistics:
+            self.ticker_statistics = pd.concat(statistics, names=["table", "ticker"])
+            self.ticker_statistics.to_csv("ticker_statistics.csv")
+            self.logger.output(f"Per-ticker statistics for {len(self.ticker_statistics)} tickers in {len(statistics)} tables stored in ticker_statistics.csv.")
+
+        return metrics
 
 
     # ─────────────────────────────────────────────
     # STRATEGIES
     # ─────────────────────────────────────────────
 
+    def get_panel(self, df):
+        """
+        Pivots a long-format table into a dates x tickers Panel once & reuses it for every strategy run on it.
+        """
+        key = id(df)
+        if key not in self.panels or self.panels[key][0] is not df:
+            self.panels[key] = (df, pivot_panel(df))
+        return self.panels[key][1]
+
+
+    def run_backtest(self, df, weights_fn, initial_portfolio_value):
+        """
+        Runs a buy-and-hold backtest on the shared array core & returns (positions, daily_portfolio) DataFrames.
+        """
+        panel = self.get_panel(df)
+        result = run_buy_and_hold(panel, weights_fn, initial_portfolio_value)
+        return positions_frame(panel, result), portfolio_frame(panel, result)
+
+
     def strategy_market_cap_weighted(self, df, initial_portfolio_value=10000):
         """
         Market cap weighted buy-and-hold portfolio.
@@ -61,27 +141,7 @@ class StrategyManager:
             self.logger.output(f"Skipping table — missing columns: {required - set(df.columns)}")
             return df, pd.DataFrame()
 
-        # Develop initial market cap weighted %s for each ticker in the starting buy-and-hold portfolio
-        df = df.sort_values(['ticker', 'date']) 
-        initial_df = df.drop_duplicates(subset='ticker', keep='first').copy()
-        initial_total_market_cap = initial_df['market_cap'].sum()
-        self.logger.output(f"Initial total market cap: {initial_total_market_cap}")
-        initial_df['market_cap_weight'] = initial_df['market_cap'] / initial_total_market_cap
-        initial_weights = initial_df[['ticker', 'market_cap_weight']].rename(columns={'market_cap_weight': 'weight'})
-
-        # Purchase shares for backtest
-        first_prices = initial_df.set_index('ticker')['close']
-        shares = (initial_weights.set_index('ticker')['weight'] * initial_portfolio_value) / first_prices
-        df = df.merge(shares.rename('shares'), left_on='ticker', right_index=True)
-
-        # Calculate daily performance
-        df['position_value'] = df['close'] * df['shares']
-        daily_portfolio = df.groupby('date')['position_value'].sum().reset_index()
-        daily_portfolio.rename(columns={'position_value': 'portfolio_value'}, inplace=True)
-        daily_portfolio['daily_return'] = (daily_portfolio['portfolio_value'].pct_change() * 100).map("{:.2f}%".format)
-        daily_portfolio['cum_return'] = ((daily_portfolio['portfolio_value'] / initial_portfolio_value - 1) * 100).map("{:.2f}%".format)
-
-        return df, daily_portfolio
+        return self.run_backtest(df, market_cap_weights, initial_portfolio_value)
 
 
     def strategy_equal_weighted(self, df, initial_portfolio_value=10000):
@@ -93,29 +153,29 @@ class StrategyManager:
             self.logger.output(f"Skipping table — missing columns: {required - set(df.columns)}")
             return df, pd.DataFrame()
 
-        df = df.sort_values(['ticker', 'date']) 
-        initial_df = df.drop_duplicates(subset='ticker', keep='first').copy()
-
-        # Assign equal weights
-        n = len(initial_df)
-        initial_df['weight'] = 1 / n
+        return self.run_backtest(df, equal_weights, initial_portfolio_value)
 
-        # Purchase shares for backtest
-        first_prices = initial_df.set_index('ticker')['close']
-        shares = (initial_df.set_index('ticker')['weight'] * initial_portfolio_value) / first_prices
-        df = df.merge(shares.rename('shares'), left_on='ticker', right_index=True)
 
-        # Calculate daily performance
-        df['position_value'] = df['close'] * df['shares']
-        daily_portfolio = df.groupby('date')['position_value'].sum().reset_index()
-        daily_portfolio.rename(columns={'position_value': 'portfolio_value'}, inplace=True)
-        daily_portfolio['daily_return'] = (daily_portfolio['portfolio_value'].pct_change() * 100).map("{:.2f}%".format)
-        daily_portfolio['cum_return'] = ((daily_portfolio['portfolio_value'] / initial_portfolio_value - 1) * 100).map("{:.2f}%".format)
+    def strategy_rebalanced(self, df, weighting, frequency, initial_portfolio_value=10000,
+                            commission_bps=1.0, slippage_bps=5.0, drift_threshold=0.05):
+        """
+        Market cap or equal weighted portfolio rebalanced daily, weekly, monthly or on drift, paying
+        commission & slippage (basis points of traded value) on every rebalance.
+        """
+        required = {'ticker', 'date', 'close'} | ({'market_cap'} if weighting == "market_cap_weighted" else set())
+        if not required.issubset(df.columns):
+            self.logger.output(f"Skipping table — missing columns: {required - set(df.columns)}")
+            return df, pd.DataFrame()
 
-        return df, daily_portfolio
+        panel = self.get_panel(df)
+        result = run_rebalanced(panel, WEIGHTS[weighting], frequency, initial_portfolio_value,
+                                commission_bps=commission_bps, slippage_bps=slippage_bps, drift_threshold=drift_threshold)
+        daily_portfolio = portfolio_frame(panel, result)
+        daily_portfolio['costs'] = result['costs']
+        return positions_frame(panel, result), daily_portfolio
 
 
-    def create_strategies(self, selected_strategies=None):
+    def create_strategies(self, selected_strategies=None, initial_portfolio_value=10000):
         """
         Runs one or more strategies on available data tables.
         Only runs strategies for 'database_ohlcv_market_caps_daily'.
@@ -123,11 +183,12 @@ class StrategyManager:
         if selected_strategies is None:
             selected_strategies = list(self.strategies.keys())
 
-        for df_name, df in self.data.items():
-            # Only run strategies for this table
+        for df_name in self.data:
+            # Only run strategies for this table (checked before touching the data, which may load lazily)
             if df_name != "database_ohlcv_market_caps_daily":
                 self.logger.output(f"Skipping {df_name} — no strategies available.")
                 continue
+            df = self.data[df_name]
 
             self.logger.output(f"Processing {df_name}...")
 
@@ -141,7 +202,7 @@ class StrategyManager:
                 self.logger.output(f"Running {strategy_name} strategy on {df_name}...")
 
                 try:
-                    strat_df, daily_portfolio = strategy_func(df)
+                    strat_df, daily_portfolio = strategy_func(df, initial_portfolio_value=initial_portfolio_value)
 
                     if daily_portfolio is None or daily_portfolio.empty:
                         self.logger.output(f"{df_name} skipped — incompatible data columns.")
@@ -149,13 +210,15 @@ class StrategyManager:
 
                     self.results[(df_name, strategy_name)] = {
                         "data": strat_df,
-                        "portfolio": daily_portfolio
+                        "portfolio": daily_portfolio,
+                        "initial_portfolio_value": initial_portfolio_value
                     }
 
-                    self.logger.output(f"Finished {strategy_name} for {df_name}.")
-                    print(self.results)
-                    daily_portfolio.to_csv("daily_portfolio.csv")
-                    strat_df.to_csv("strat_df.csv")
+                    final = daily_portfolio.iloc[-1]
+                    self.logger.output(f"Finished {strategy_name} for {df_name}: final value {final['portfolio_value']:,.2f} "
+                                       f"({final['cum_return']:.2%} cumulative return).")
+                    daily_portfolio.to_csv(f"daily_portfolio_{strategy_name}.csv")
+                    strat_df.to_csv(f"strat_df_{strategy_name}.csv")
 
                 except Exception as e:
                     self.logger.output(f"Error running {strategy_name} for {df_name}: {e}")
@@ -163,36 +226,84 @@ class StrategyManager:
         return self.results
 
 
-
-    def plot_histograms(self):
+    def run_sweep(self, strategies, parameters=None, universes=None, windows=None, initial_portfolio_values=(10000,),
+                  df_name="database_ohlcv_market_caps_daily", max_workers=None):
         """
-        WIP tools for visualization. 
+        Runs a grid of strategies x parameters x universes x date windows across a process pool (see SweepRunner).
+        e.g. run_sweep(["market_cap_weighted_monthly"], parameters={"commission_bps": [0, 1, 5]},
+                       windows=[("2020-01-01", "2022-12-31"), ("2023-01-01", "2025-09-26")])
+        Returns the tidy results table (one row per run) & stores it, with each run's daily portfolio value
+        & turnover, in self.results[(df_name, "sweep")].
         """
-        if not os.path.exists('plots'):
-            os.makedirs('plots')
-
-        for df_name, df in self.data.items():
-            numeric_columns = df.select_dtypes(include='number').columns
-
-            if 'ticker' in df.columns:
-                tickers = df['ticker'].unique()
+        runner = SweepRunner(self.logger, max_workers)
+        results = runner.run(self.data[df_name], strategies, parameters, universes, windows, initial_portfolio_values)
+        self.results[(df_name, "sweep")] = {
+            "data": results,
+            "portfolio": runner.portfolio_values,
+            "turnover": runner.turnover
+        }
+        results.to_csv("sweep_results.csv", index=False)
+        return results
 
-                for ticker in tickers:
-                    ticker_data = df[df['ticker'] == ticker]
 
-                    for col in numeric_columns:
-                        self.logger.output(f"Plotting {df_name}_{col}_{ticker}_hist...")
-                        
-                        plot_dir = f'plots/{df_name}/{ticker}'
-                        if not os.path.exists(plot_dir):
-                            os.makedirs(plot_dir)
-                        
-                        plt.figure(figsize=(16, 9))
-                        plt.hist(ticker_data[col], bins=30, color='black', alpha=0.7, density=True)
-                        plt.title(f'{col} in {df_name} for {ticker}')
-                        plt.xlabel(col)
-                        plt.ylabel('pct')
-                        plt.tight_layout()
-                        plt.savefig(f'{plot_dir}/{df_name}_{col}_{ticker}_hist.png')
-                        self.logger.output(f"{df_name}_{col}_{ticker}_hist stored.")
-                        plt.close()
+    def stream_strategy(self, database_manager, strategy_name, database=None, table="ohlcv_market_caps_daily",
+                        tickers=None, start_date=None, end_date=None, chunksize=100000, initial_portfolio_value=10000,
+                        positions=False, **parameters):
+        """
+        Out-of-core variant of create_strategies for tables that do not fit in memory. The table is read from
+        SQLite in date-ordered chunks (DatabaseManager.stream_shards) & only the portfolio state is carried
+        between them. Daily portfolio rows are appended to daily_portfolio_{strategy_name}.csv as each chunk
+        finishes (& positions to strat_df_{strategy_name}.csv with positions=True), so peak memory is bounded
+        by `chunksize`. `parameters` go to rebalanced strategies (commission_bps, slippage_bps, drift_threshold).
+        `database` defaults to the manager's databases: every shard, merged by date (DatabaseManager.stream_shards),
+        when it is sharded, otherwise its first database. Returns the last daily portfolio row.
+        """
+        weighting, frequency = resolve_strategy(strategy_name)
+        columns = ['date', 'ticker', 'close'] + (['market_cap'] if weighting == "market_cap_weighted" else [])
+        filters = dict(columns=columns, tickers=tickers, start_date=start_date, end_date=end_date)
+
+        if database is not None:
+            databases = [database]
+        else:
+            databases = database_manager.databases if database_manager.sharded else database_manager.databases[:1]
+            database = ", ".join(databases)
+
+        # Each ticker lives in one shard, so its first row is that shard's
+        entry = pd.concat([database_manager.get_first_rows(shard, table, **filters) for shard in databases],
+                          ignore_index=True) if frequency is None else None
+
+        portfolio_path, positions_path = f"daily_portfolio_{strategy_name}.csv", f"strat_df_{strategy_name}.csv"
+        self.logger.output(f"Streaming {strategy_name} strategy on {table} ({database}) in chunks of {chunksize} rows...")
+        backtest, final, rows, first_chunk = None, None, 0, True
+        for chunk in database_manager.stream_shards(databases, table, chunksize=chunksize, **filters):
+            if backtest is None:
+                # The chunks' ticker categories are the universe of the whole stream
+                backtest = StreamingBacktest(chunk['ticker'].cat.categories, WEIGHTS[weighting], frequency, initial_portfolio_value,
+                                             entry, fields=tuple(columns[2:]), **parameters)
+            panel, result = backtest.update(chunk)
+            daily_portfolio = portfolio_frame(panel, result)
+            if frequency is not None:
+                daily_portfolio['costs'] = result['costs']
+            daily_portfolio.to_csv(portfolio_path, mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+            if positions:
+                positions_frame(panel, result).to_csv(positions_path, mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+            first_chunk = False
+            rows += len(chunk)
+            final = daily_portfolio.iloc[-1]
+
+        if final is None:
+            self.logger.output(f"No rows to stream from {table} ({database}).")
+            return None
+        self.logger.output(f"Finished streaming {strategy_name} over {rows} rows: final value {final['portfolio_value']:,.2f} "
+                           f"({final['cum_return']:.2%} cumulative return).")
+        return final
+
+
+    def plot_histograms(self, bins=30, max_workers=None):
+        """
+        Per-ticker histograms of every numeric column (except ids & request metadata) of every table, stored
+        as plots/<table>/<ticker>/<table>_<column>_<ticker>_hist.png. Rendering is headless, parallel &
+        incremental: plots whose data is unchanged since the last run are skipped (see ChartRenderer).
+        """
+        renderer = ChartRenderer(self.logger, bins=bins, max_workers=max_workers)
+        return renderer.render((df_name, df) for df_name, df in self.data.items())
@@ -0,0 +1,176 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from backtest_engine import Panel, pivot_panel, run_buy_and_hold, run_rebalanced, WEIGHTS, REBALANCE_FREQUENCIES
+
+_WORKER = {}  # Per-process state: the shared Panel & the SharedMemory handles backing it
+
+
+def resolve_strategy(name):
+    """
+    Maps a strategy name to (weighting, frequency): "equal_weighted" -> ("equal_weighted", None) (buy-and-hold),
+    "market_cap_weighted_monthly" -> ("market_cap_weighted", "monthly").
+    """
+    if name in WEIGHTS:
+        return name, None
+    weighting, _, frequency = name.rpartition("_")
+    if weighting in WEIGHTS and frequency in REBALANCE_FREQUENCIES:
+        return weighting, frequency
+    raise ValueError(f"No available strategy named '{name}'")
+
+
+def _attach(spec):
+    """
+    Process pool initializer: maps the parent's shared memory blocks into a Panel without copying.
+    """
+    fields = {}
+    handles = []
+    for field, (name, shape, dtype) in spec['fields'].items():
+        # Pool workers share the parent's resource tracker, so the blocks stay registered to (& are unlinked by) the parent
+        handle = shared_memory.SharedMemory(name=name)
+        handles.append(handle)
+        fields[field] = np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+    _WORKER['panel'] = Panel(spec['dates'], spec['tickers'], fields)
+    _WORKER['handles'] = handles
+
+
+def _run(run):
+    """
+    Runs one backtest of the grid on the shared Panel (restricted to the run's universe & date window).
+    """
+    start = time.perf_counter()
+    panel = _WORKER['panel']
+
+    rows = slice(np.searchsorted(panel.dates, np.datetime64(run['start_date']), side="left"),
+                 np.searchsorted(panel.dates, np.datetime64(run['end_date']), side="right"))
+    if run['universe_tickers'] is None:
+        columns = slice(None)
+    else:
+        columns = np.flatnonzero(np.isin(panel.tickers, run['universe_tickers']))
+    window = Panel(panel.dates[rows], panel.tickers[columns], {field: matrix[rows][:, columns] for field, matrix in panel.fields.items()})
+
+    weighting, frequency = resolve_strategy(run['strategy'])
+    if frequency is None:
+        result = run_buy_and_hold(window, WEIGHTS[weighting], run['initial_portfolio_value'])
+        costs = 0.0
+    else:
+        result = run_rebalanced(window, WEIGHTS[weighting], frequency, run['initial_portfolio_value'], **run['parameters'])
+        costs = float(result['costs'].sum())
+
+    value = result['portfolio_value']
+    summary = {
+        "final_value": float(value[-1]) if len(value) else np.nan,
+        "total_return": float(result['cum_return'][-1]) if len(value) else np.nan,
+        "total_costs": costs,
+        "mean_turnover": float(result['turnover'].mean()) if len(value) else np.nan,
+        "n_dates": window.shape[0],
+        "n_tickers": window.shape[1],
+        "seconds": time.perf_counter() - start,
+        "pid": os.getpid(),
+    }
+    return run['run_id'], summary, window.dates, value, result['turnover']
+
+
+class SweepRunner:
+    """
+    Fans a grid of strategies x parameters x universes x date windows out across a process pool.
+    The price panel is pivoted once & placed in shared memory, which every worker maps instead of receiving
+    a pickled copy. Results come back as one tidy DataFrame keyed by the run parameters; the portfolio value
+    & turnover of every run are kept in `portfolio_values` & `turnover` (dates x run_id).
+    """
+    def __init__(self, logger, max_workers=None):
+        self.logger = logger
+        self.max_workers = max_workers or os.cpu_count()
+        self.portfolio_values = pd.DataFrame()
+        self.turnover = pd.DataFrame()
+
+
+    def build_grid(self, strategies, parameters=None, universes=None, windows=None, initial_portfolio_values=(10000,)):
+        """
+        Cartesian product of the grid. `parameters` ({name: [values]}) only applies to rebalanced strategies.
+        `universes` is {name: [tickers]} (None = all tickers), `windows` a list of (start_date, end_date).
+        """
+        universes = universes or {"all": None}
+        windows = windows or [(None, None)]
+        parameter_names = sorted(parameters or {})
+        parameter_grid = [dict(zip(parameter_names, values)) for values in itertools.product(*((parameters or {})[name] for name in parameter_names))]
+
+        runs = []
+        for strategy in strategies:
+            _, frequency = resolve_strategy(strategy)
+            for params, (universe, tickers), (start_date, end_date), initial_value in itertools.product(
+                parameter_grid if frequency else [{}], universes.items(), windows, initial_portfolio_values
+            ):
+                runs.append({
+                    "run_id": len(runs),
+                    "strategy": strategy,
+                    "universe": universe,
+                    "universe_tickers": tickers,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "initial_portfolio_value": initial_value,
+                    "parameters": params,
+                })
+        return runs
+
+
+    def share_panel(self, panel):
+        """
+        Copies the panel's matrices into shared memory blocks. Returns (spec for workers, handles to unlink).
+        """
+        spec = {"dates": panel.dates, "tickers": panel.tickers, "fields": {}}
+        handles = []
+        for field, matrix in panel.fields.items():
+            handle = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=handle.buf)[:] = matrix
+            spec['fields'][field] = (handle.name, matrix.shape, matrix.dtype.str)
+            handles.append(handle)
+        return spec, handles
+
+
+    def run(self, df, strategies, parameters=None, universes=None, windows=None, initial_portfolio_values=(10000,)):
+        """
+        Runs the grid on a long-format (date, ticker, close, market_cap, ...) DataFrame & returns the results table.
+        """
+        panel = pivot_panel(df)
+        first, last = pd.Timestamp(panel.dates[0]).date(), pd.Timestamp(panel.dates[-1]).date()
+        runs = self.build_grid(strategies, parameters, universes, windows, initial_portfolio_values)
+        for run in runs:
+            run['start_date'] = str(run['start_date'] or first)
+            run['end_date'] = str(run['end_date'] or last)
+
+        self.logger.output(f"Sweep: {len(runs)} runs on {panel.shape[0]} dates x {panel.shape[1]} tickers across {self.max_workers} processes...")
+        spec, handles = self.share_panel(panel)
+        summaries, values, turnover = {}, {}, {}
+        start = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_attach, initargs=(spec,)) as executor:
+                futures = [executor.submit(_run, run) for run in runs]
+                for done, future in enumerate(as_completed(futures), 1):
+                    run_id, summary, dates, value, run_turnover = future.result()
+                    summaries[run_id] = summary
+                    values[run_id] = pd.Series(value, index=dates)
+                    turnover[run_id] = pd.Series(run_turnover, index=dates)
+                    self.logger.output(f"Sweep [{done}/{len(runs)}] run {run_id} ({runs[run_id]['strategy']}) "
+                                       f"finished in {summary['seconds']:.3f}s — {summary['total_return']:.2%} total return.")
+        finally:
+            for handle in handles:
+                handle.close()
+                handle.unlink()
+        self.logger.output(f"Sweep finished: {len(runs)} runs in {time.perf_counter() - start:.2f}s.")
+
+        results = pd.DataFrame([
+            {
+                "run_id": run['run_id'], "strategy": run['strategy'], "universe": run['universe'],
+                "start_date": run['start_date'], "end_date": run['end_date'],
+                "initial_portfolio_value": run['initial_portfolio_value'], **run['parameters'], **summaries[run['run_id']],
+            }
+            for run in runs
+        ])
+        self.portfolio_values = pd.DataFrame(values).sort_index()
+        self.turnover = pd.DataFrame(turnover).sort_index()
+        return results
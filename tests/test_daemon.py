@@ -0,0 +1,54 @@
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+import trading_calendar
+from response_cache import ResponseCache
+from daemon import Daemon, MARKET_TIMEZONE
+from benchmarks.mock_polygon import MockPolygonServer
+from workspace import WorkspaceTestCase
+
+TICKERS = ["JPM", "GS", "WFC"]
+
+
+class DaemonUpdateTest(WorkspaceTestCase):
+    """
+    Updates run against the local polygon.io stand-in, with today treated as a trading day whatever the weekday.
+    """
+    def setUp(self):
+        super().setUp()
+        self.today = datetime.now(MARKET_TIMEZONE).date()
+        is_trading_day = trading_calendar.is_trading_day
+        trading_today = lambda day: trading_calendar.to_date(day) == self.today or is_trading_day(day)
+        for target in ("trading_calendar.is_trading_day", "benchmarks.mock_polygon.is_trading_day"):
+            patcher = mock.patch(target, trading_today)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_update_after_close_ingests_todays_bar(self):
+        today = self.today.strftime("%Y-%m-%d")
+        response_cache = ResponseCache("response_cache.db")
+        with MockPolygonServer(published_through=(self.today - timedelta(days=1)).strftime("%Y-%m-%d")) as server:
+            database_manager = self.create_database_manager(["database.db"], TICKERS, requests_per_minute=None, base_url=server.url,
+                                                     response_cache=response_cache, market_cap_method="snapshots")
+            daemon = Daemon(database_manager, self.logger, (self.today - timedelta(days=14)).strftime("%Y-%m-%d"), ["equal_weighted"], port=0)
+
+            daemon.update()  # Catch-up at start; history up to yesterday is covered from here on
+            daemon.update()  # Before the close: only today is requested & its bar is not published yet
+            self.assertLess(daemon.cache.df['date'].max().strftime("%Y-%m-%d"), today)
+
+            server.httpd.published_through = today  # After the close
+            daemon.update()
+            daemon.httpd.server_close()
+        response_cache.close()
+
+        connection = sqlite3.connect("database.db")
+        stored = {row[0] for row in connection.execute("SELECT ticker FROM ohlcv_daily WHERE date = ?", (today,))}
+        connection.close()
+        self.assertEqual(stored, set(TICKERS))
+        self.assertEqual(daemon.cache.df['date'].max().strftime("%Y-%m-%d"), today)
+        self.assertEqual(daemon.cache.portfolios["equal_weighted"]['date'].max().strftime("%Y-%m-%d"), today)
+
+
+if __name__ == "__main__":
+    unittest.main()
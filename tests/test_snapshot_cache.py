@@ -0,0 +1,33 @@
+import unittest
+from snapshot_cache import SnapshotCache
+from benchmarks.synthetic_data import populate
+from workspace import WorkspaceTestCase
+
+JOINED = "database_ohlcv_market_caps_daily"
+
+
+class SnapshotCacheTest(WorkspaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database_manager = self.create_database_manager(["database.db"], ["JPM", "GS"])
+        self.cache = SnapshotCache("snapshots", self.logger)
+
+    def load(self):
+        return self.database_manager.get_database_tables(snapshot_cache=self.cache)[JOINED]
+
+    def test_snapshot_taken_before_join_is_rebuilt_after_it(self):
+        populate(self.database_manager, "2025-01-02", "2025-03-31")
+        self.database_manager.join_tables()
+        self.assertEqual(len(self.load()), len(self.load()))  # Built, then served from the snapshot
+
+        populate(self.database_manager, "2025-04-01", "2025-04-30")
+        before_join = self.load()  # New source rows are not joined yet
+        self.database_manager.join_tables()
+        after_join = self.load()
+
+        self.assertGreater(len(after_join), len(before_join))
+        self.assertEqual(f"{after_join['date'].max():%Y-%m-%d}", "2025-04-30")
+
+
+if __name__ == "__main__":
+    unittest.main()
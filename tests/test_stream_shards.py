@@ -0,0 +1,41 @@
+import unittest
+import pandas as pd
+from strategy_manager import StrategyManager
+from benchmarks.synthetic_data import populate, ticker_universe
+from workspace import WorkspaceTestCase
+
+STRATEGIES = ["equal_weighted", "market_cap_weighted_monthly"]
+
+
+class StreamShardsTest(WorkspaceTestCase):
+    def setUp(self):
+        super().setUp()
+        tickers = ticker_universe(9)
+        self.single = self.create_database_manager(["single.db"], tickers)
+        self.sharded = self.create_database_manager([f"database_{i}.db" for i in range(3)], tickers)
+        for database_manager in (self.single, self.sharded):
+            populate(database_manager, "2025-01-02", "2025-04-30")
+            database_manager.join_tables()
+        self.strategy_manager = StrategyManager({}, self.logger)
+
+    def stream(self, database_manager, strategy_name, **kwargs):
+        self.strategy_manager.stream_strategy(database_manager, strategy_name, **kwargs)
+        return pd.read_csv(f"daily_portfolio_{strategy_name}.csv")
+
+    def test_shards_are_merged_by_date(self):
+        chunks = list(self.sharded.stream_shards(self.sharded.databases, chunksize=50))
+        dates = pd.concat([chunk['date'] for chunk in chunks], ignore_index=True)
+        self.assertTrue(dates.is_monotonic_increasing)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLess(previous['date'].iloc[-1], chunk['date'].iloc[0])  # No date split across chunks
+        self.assertEqual(len(dates), sum(len(chunk) for chunk in self.single.stream_table("single.db")))
+
+    def test_sharded_stream_matches_single_database(self):
+        for strategy_name in STRATEGIES:
+            with self.subTest(strategy_name=strategy_name):
+                expected = self.stream(self.single, strategy_name, chunksize=50)
+                pd.testing.assert_frame_equal(self.stream(self.sharded, strategy_name, chunksize=50), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
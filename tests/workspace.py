@@ -0,0 +1,29 @@
+import os
+import tempfile
+import unittest
+from logger import Logger
+from database_manager import DatabaseManager
+
+TABLES = ["ohlcv_daily", "market_caps_daily"]
+
+
+class WorkspaceTestCase(unittest.TestCase):
+    """
+    Runs each test in a fresh temporary directory (databases, snapshots & logs use relative paths as in main.py)
+    with a synchronous logger that only prints errors.
+    """
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        self.logger = Logger("Aurelius_test", "0", asynchronous=False, console_level="error")
+        self.addCleanup(self.logger.close)
+
+    def create_database_manager(self, databases, tickers, **kwargs):
+        """
+        An initialized DatabaseManager over `databases` holding the daily OHLCV & market cap tables.
+        """
+        database_manager = DatabaseManager(databases, TABLES, tickers, self.logger, **kwargs)
+        database_manager.initialize_database()
+        return database_manager
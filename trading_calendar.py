@@ -0,0 +1,121 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# One-off NYSE full-day closures that are not part of the regular holiday rules
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # September 11 attacks
+    date(2004, 6, 11),   # Funeral of Ronald Reagan
+    date(2007, 1, 2),    # Funeral of Gerald Ford
+    date(2012, 10, 29), date(2012, 10, 30),  # Hurricane Sandy
+    date(2018, 12, 5),   # Funeral of George H.W. Bush
+    date(2025, 1, 9),    # Funeral of Jimmy Carter
+}
+
+
+def to_date(value):
+    """
+    Accepts a date, datetime or YYYY-MM-DD string & returns a date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def easter_sunday(year):
+    """
+    Gregorian Easter Sunday (anonymous Gregorian algorithm).
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """
+    The n-th given weekday (Mon=0) of a month; n=-1 gives the last one.
+    """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(holiday):
+    """
+    NYSE observance: Saturday holidays move to Friday, Sunday holidays to Monday.
+    """
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """
+    Set of NYSE full-day market holidays for a year, computed offline from the exchange's rules.
+    """
+    holidays = {
+        nth_weekday(year, 2, 0, 3),              # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2), # Good Friday
+        nth_weekday(year, 5, 0, -1),             # Memorial Day
+        observed(date(year, 7, 4)),              # Independence Day
+        nth_weekday(year, 9, 0, 1),              # Labor Day
+        nth_weekday(year, 11, 3, 4),             # Thanksgiving
+        observed(date(year, 12, 25)),            # Christmas
+    }
+
+    # New Year's Day is not moved back to Friday when it falls on a Saturday
+    new_years = date(year, 1, 1)
+    if new_years.weekday() != 5:
+        holidays.add(observed(new_years))
+    if year >= 1998:
+        holidays.add(nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19))) # Juneteenth
+
+    holidays.update(d for d in SPECIAL_CLOSURES if d.year == year)
+    return frozenset(holidays)
+
+
+def is_trading_day(day):
+    day = to_date(day)
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+def trading_days(start_date, end_date):
+    """
+    List of NYSE trading days in YYYY-MM-DD format between two dates (inclusive).
+    """
+    start_date, end_date = to_date(start_date), to_date(end_date)
+    return [
+        (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end_date - start_date).days + 1)
+        if is_trading_day(start_date + timedelta(days=i))
+    ]
+
+
+def contiguous_runs(dates):
+    """
+    Groups sorted YYYY-MM-DD dates into runs with no trading day missing in between.
+    Returns a list of (first_date, last_date) tuples.
+    """
+    runs = []
+    for day in dates:
+        if runs and not trading_days(to_date(runs[-1][1]) + timedelta(days=1), to_date(day) - timedelta(days=1)):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs